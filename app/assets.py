@@ -0,0 +1,245 @@
+"""
+Static asset pipeline.
+
+``python -m app.manage build-assets`` downloads the pinned front-end bundles
+into ``app/static/vendor``, then copies every static file into
+``app/static/dist`` under a content-hashed name (``header.3f9c1a2b7d4e.jpg``),
+writes ``.gz``/``.br`` siblings for text assets and resized WebP/AVIF/JPEG
+variants for the images in ``IMAGE_VARIANTS``. ``manifest.json`` maps logical
+names to the built files.
+
+Templates call ``static_url("header.jpg")``; without a build it falls back to
+the unhashed file (or the CDN for vendored bundles), so development needs no
+build step. ``AssetFiles`` serves the precompressed siblings and marks hashed
+files ``immutable``.
+"""
+import hashlib
+import json
+import mimetypes
+import shutil
+import stat
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+STATIC_DIR = Path(__file__).parent / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_FILE = DIST_DIR / "manifest.json"
+STATIC_PREFIX = "/static"
+
+# Logical name -> pinned CDN build, fetched by the build step
+VENDOR_BUNDLES = {
+    "vendor/chart.umd.min.js": "https://cdn.jsdelivr.net/npm/chart.js@4.4.9/dist/chart.umd.min.js",
+    "vendor/chartjs-plugin-datalabels.min.js": "https://cdn.jsdelivr.net/npm/chartjs-plugin-datalabels@2.2.0/dist/chartjs-plugin-datalabels.min.js",
+    "vendor/chartjs-chart-matrix.min.js": "https://cdn.jsdelivr.net/npm/chartjs-chart-matrix@1.2.0/dist/chartjs-chart-matrix.min.js",
+}
+
+# Image -> widths to render. The login header is shown at most ~480 CSS px wide.
+IMAGE_VARIANTS = {"header.jpg": (480, 960)}
+IMAGE_FORMATS = (("avif", "image/avif"), ("webp", "image/webp"), ("jpg", "image/jpeg"))
+
+COMPRESSIBLE_SUFFIXES = {".js", ".css", ".svg", ".json", ".txt", ".html", ".map"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+
+def variant_name(name: str, width: int, extension: str) -> str:
+    stem = name.rsplit(".", 1)[0]
+    return f"{stem}-{width}w.{extension}"
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, dot, suffix = name.rpartition(".")
+    return f"{stem}.{digest}.{suffix}" if dot else f"{name}.{digest}"
+
+
+def vendor_bundles(force: bool = False) -> list[str]:
+    fetched = []
+    for name, url in VENDOR_BUNDLES.items():
+        target = STATIC_DIR / name
+        if target.exists() and not force:
+            continue
+        import urllib.request
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            target.write_bytes(response.read())
+        fetched.append(name)
+    return fetched
+
+
+def _compress(path: Path, content: bytes) -> list[str]:
+    # Keep a compressed sibling only when it is actually smaller
+    import gzip
+
+    written = []
+    encoded = {"gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        encoded["br"] = brotli.compress(content, quality=11)
+    for suffix, data in encoded.items():
+        if len(data) < len(content):
+            path.with_name(f"{path.name}.{suffix}").write_bytes(data)
+            written.append(suffix)
+    return written
+
+
+def _render_variants(source: Path, widths: tuple[int, ...]) -> dict[str, bytes]:
+    from PIL import Image, features
+
+    variants = {}
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        for width in widths:
+            width = min(width, image.width)
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            for extension, _ in IMAGE_FORMATS:
+                if extension == "avif" and not features.check("avif"):
+                    continue
+                buffer = BytesIO()
+                if extension == "avif":
+                    resized.save(buffer, "AVIF", quality=55)
+                elif extension == "webp":
+                    resized.save(buffer, "WEBP", quality=80, method=6)
+                else:
+                    resized.save(buffer, "JPEG", quality=82, optimize=True, progressive=True)
+                variants[variant_name(source.relative_to(STATIC_DIR).as_posix(), width, extension)] = buffer.getvalue()
+    return variants
+
+
+def build_assets() -> dict[str, str]:
+    """
+    Rebuilds ``app/static/dist`` from ``app/static`` and returns the manifest.
+
+    Image variants need Pillow (AVIF needs a Pillow built with libavif) and
+    ``.br`` files need the ``brotli`` package; missing either just skips them.
+    """
+    if DIST_DIR.exists():
+        shutil.rmtree(DIST_DIR)
+    DIST_DIR.mkdir(parents=True)
+
+    sources: dict[str, bytes] = {}
+    for path in sorted(STATIC_DIR.rglob("*")):
+        if path.is_file() and DIST_DIR not in path.parents:
+            sources[path.relative_to(STATIC_DIR).as_posix()] = path.read_bytes()
+
+    try:
+        for name, widths in IMAGE_VARIANTS.items():
+            if sources.get(name):
+                sources.update(_render_variants(STATIC_DIR / name, widths))
+    except ImportError:
+        pass  # Pillow not installed: ship the originals only
+
+    manifest = {}
+    for name, content in sources.items():
+        hashed = fingerprint(name, content)
+        target = DIST_DIR / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(content)
+        if Path(name).suffix in COMPRESSIBLE_SUFFIXES:
+            _compress(target, content)
+        manifest[name] = hashed
+
+    MANIFEST_FILE.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    load_manifest.cache_clear()
+    return manifest
+
+
+@lru_cache(maxsize=None)
+def load_manifest() -> dict[str, str]:
+    # Read once; build_assets() clears it after writing a new one
+    try:
+        return json.loads(MANIFEST_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def static_url(name: str) -> str:
+    # Fingerprinted URL when built; otherwise the plain file, or the CDN for vendored bundles
+    hashed = load_manifest().get(name)
+    if hashed is not None:
+        return f"{STATIC_PREFIX}/dist/{hashed}"
+    if name in VENDOR_BUNDLES and not (STATIC_DIR / name).exists():
+        return VENDOR_BUNDLES[name]
+    return f"{STATIC_PREFIX}/{name}"
+
+
+def image_sources(name: str) -> dict[str, str]:
+    """
+    ``srcset`` strings for the built variants of an image, keyed by MIME type
+    (best format first). Empty when the variants have not been built.
+    """
+    manifest = load_manifest()
+    widths = IMAGE_VARIANTS.get(name, ())
+    sources = {}
+    for extension, mime_type in IMAGE_FORMATS:
+        candidates = [
+            f"{static_url(variant_name(name, width, extension))} {width}w"
+            for width in widths
+            if variant_name(name, width, extension) in manifest
+        ]
+        if candidates:
+            sources[mime_type] = ", ".join(candidates)
+    return sources
+
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles that serves ``.br``/``.gz`` siblings to clients that accept
+    them and sends far-future ``immutable`` caching for fingerprinted files.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        immutable = path.startswith("dist/") and not path.endswith("manifest.json")
+        response = None
+        if Path(path).suffix in COMPRESSIBLE_SUFFIXES:
+            accepted = Headers(scope=scope).get("accept-encoding", "")
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if encoding not in accepted:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                    response = FileResponse(
+                        full_path,
+                        stat_result=stat_result,
+                        media_type=mimetypes.guess_type(path)[0],
+                        headers={"Content-Encoding": encoding},
+                    )
+                    break
+            if response is None:
+                response = await super().get_response(path, scope)
+            response.headers.append("Vary", "Accept-Encoding")
+        else:
+            response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+        return response
+
+
+class DynamicCompression:
+    """
+    Wraps a compression middleware so it skips ``/static``: built text assets
+    are already compressed and images don't shrink. Event streams are skipped
+    too, since compressors buffer and would hold back each event.
+    """
+
+    def __init__(self, app, compressor, **options):
+        self.app = app
+        self.compressed = compressor(app, **options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and (
+            scope["path"].startswith(STATIC_PREFIX + "/") or (b"accept", b"text/event-stream") in scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed(scope, receive, send)
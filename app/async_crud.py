@@ -0,0 +1,65 @@
+"""
+Async versions of the crud functions used by the hot routes.
+
+Each function takes the session yielded by ``database.get_async_db``. With an
+AsyncSession (``DB_ASYNC=true``) the query runs through aiosqlite via
+``run_sync``, so the event loop is never blocked on SQLite. With a regular
+Session the sync crud function is pushed to the threadpool. Either way the
+query logic lives only in ``app.crud``.
+"""
+from datetime import date
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+
+
+async def _run(fn, *args, session, **kwargs):
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(lambda sync_session: fn(*args, session=sync_session, **kwargs))
+    return await run_in_threadpool(fn, *args, session=session, **kwargs)
+
+
+async def get_user_by_username(username: str, *, session):
+    return await _run(crud.get_user_by_username, username, session=session)
+
+async def get_user_with_authorization(username: str, *, session):
+    return await _run(crud.get_user_with_authorization, username, session=session)
+
+async def is_authorized(username: str, *, session):
+    return await _run(crud.is_authorized, username, session=session)
+
+async def get_paid_week_dates(username: str, *, session):
+    return await _run(crud.get_paid_week_dates, username, session=session)
+
+async def get_member_stats(username: str, *, session):
+    return await _run(crud.get_member_stats, username, session=session)
+
+async def get_all_member_stats(*, session):
+    return await _run(crud.get_all_member_stats, session=session)
+
+async def get_total_saved(username: str, *, session):
+    return await _run(crud.get_total_saved, username, session=session)
+
+async def get_leaderboard_columns(*, session):
+    return await _run(crud.get_leaderboard_columns, session=session)
+
+async def get_week_amounts(username: str, *, session):
+    return await _run(crud.get_week_amounts, username, session=session)
+
+async def get_recent_deposits(username: str, limit: int = 5, *, session):
+    return await _run(crud.get_recent_deposits, username, limit=limit, session=session)
+
+async def save_deposits_bulk(
+    username: str,
+    allocations: list[tuple[Optional[date], float]],
+    today: Optional[date] = None,
+    *,
+    session,
+) -> crud.BulkDepositResult:
+    return await _run(crud.save_deposits_bulk, username, allocations, today=today, session=session)
+
+async def save_deposit_batch(requests: list, *, session) -> list:
+    return await _run(crud.save_deposit_batch, requests, session=session)
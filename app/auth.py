@@ -0,0 +1,152 @@
+"""
+Signed session tokens and the in-process authorization cache.
+
+The session cookie carries the user id, username, saving group and
+authorization status, signed with HMAC-SHA256, so authenticating a request
+(and routing it to its group's shard) needs no database query.
+Authorization changes bump a revocation counter: tokens issued before the
+latest change are re-checked against a small LRU of authorization state (and
+the database only on a miss), so deauthorization takes effect immediately.
+The counter is shared by all worker processes (``app.coherence``), and LRU
+entries remember the revision they were read at, so a change made in one
+worker also invalidates what the others have cached.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from app.coherence import AUTH_REVISION, shared_counters
+from app.settings import DEFAULT_GROUP, current_group
+
+SESSION_COOKIE = "session"
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", str(30 * 24 * 3600)))
+
+# Without SESSION_SECRET every restart signs with a new key and logs everyone
+# out; the app logs a warning at startup (see EPHEMERAL_SECRET).
+EPHEMERAL_SECRET = not os.getenv("SESSION_SECRET")
+_secret = os.getenv("SESSION_SECRET", "").encode() or secrets.token_bytes(32)
+
+
+class SessionClaims(NamedTuple):
+    user_id: int
+    username: str
+    authorized: bool
+    revision: int
+    issued_at: int
+    group: str = DEFAULT_GROUP  # tokens from before groups existed belong to the default one
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_secret, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_session_token(user_id: int, username: str, authorized: bool) -> str:
+    # For the current group: call it inside use_group(the user's group)
+    claims = {
+        "uid": user_id,
+        "u": username,
+        "a": authorized,
+        "r": get_auth_revision(),
+        "iat": int(time.time()),
+        "g": current_group(),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_session_token(token: Optional[str]) -> Optional[SessionClaims]:
+    if not token or "." not in token:
+        return None
+    payload, signature = token.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+        session_claims = SessionClaims(
+            claims["uid"], claims["u"], claims["a"], claims["r"], claims["iat"], claims.get("g", DEFAULT_GROUP)
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+    if session_claims.issued_at + SESSION_MAX_AGE < time.time():
+        return None
+    return session_claims
+
+
+class AuthorizationCache:
+    """Thread-safe LRU of username -> (revision, authorized)."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[int, bool]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str, revision: int) -> Optional[bool]:
+        # Entries read at an older revision may predate a change made elsewhere
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            if entry[0] != revision:
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return entry[1]
+
+    def set(self, username: str, authorized: bool, revision: int):
+        with self._lock:
+            self._entries[username] = (revision, authorized)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+
+authorization_cache = AuthorizationCache(int(os.getenv("AUTH_CACHE_SIZE", "1024")))
+
+
+def get_auth_revision() -> int:
+    return shared_counters().get(AUTH_REVISION)
+
+
+def revoke_authorization_state(username: str):
+    # Called by crud after authorize/deauthorize commits
+    shared_counters().increment(AUTH_REVISION)
+    authorization_cache.invalidate(username)
+
+
+def cached_authorization(claims: SessionClaims) -> Optional[bool]:
+    """
+    Authorization status for a verified session without touching the database.
+
+    Returns None when neither the token nor the cache can answer, in which case
+    the caller looks it up and stores it with ``remember_authorization``.
+    """
+    revision = get_auth_revision()
+    if claims.revision == revision:
+        return claims.authorized
+    return authorization_cache.get(claims.username, revision)
+
+
+def remember_authorization(username: str, authorized: bool, revision: int):
+    # `revision` is the value read before the database lookup; if a change landed
+    # in between, the looked-up value may already be stale, so don't cache it.
+    if revision == get_auth_revision():
+        authorization_cache.set(username, authorized, revision)
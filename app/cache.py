@@ -0,0 +1,162 @@
+"""
+In-process caching keyed on a per-group data version.
+
+Every write that changes what the group pages show calls ``bump_data_version()``.
+Cached entries remember the version they were computed at and are treated as
+missing once it moves on, so nothing has to be invalidated key by key. The
+version lives in ``app.coherence``'s shared counters, so a write in one worker
+process invalidates the caches of all of them. Each saving group has its own
+version, and cache keys are scoped to the current group, so groups never see
+(or invalidate) each other's entries.
+
+Cache misses go through ``cached_computation``. Concurrent misses for the same
+key and version share one computation (single flight), and new computations
+are refused with ``Overloaded`` once too many are already running.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from app.coherence import DATA_VERSION, shared_counters
+from app.settings import current_group, on_settings_reload
+
+
+def get_data_version() -> int:
+    return shared_counters().get(DATA_VERSION)
+
+
+def bump_data_version() -> int:
+    return shared_counters().increment(DATA_VERSION)
+
+
+# Cached pages embed the goal and calendar from global.env
+on_settings_reload(bump_data_version)
+
+
+class VersionedCache:
+    """
+    Size-bounded LRU cache whose entries expire after ``ttl`` seconds or as soon
+    as the data version changes. Keys are scoped to the current group.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[int, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        key = (current_group(), key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            version, expires_at, value = entry
+            if version != get_data_version() or expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None):
+        # Pass the version read *before* computing value, so a write that lands
+        # mid-computation leaves the entry already stale.
+        version = get_data_version() if version is None else version
+        key = (current_group(), key)
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def make_etag(body: bytes) -> str:
+    # Strong validator: derived from the exact bytes served
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+leaderboard_cache = VersionedCache(
+    maxsize=int(os.getenv("LEADERBOARD_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("LEADERBOARD_CACHE_TTL", "300")),
+)
+
+
+class Overloaded(Exception):
+    """Too much work is already in flight (computations, event streams); the app answers 503."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one asyncio task.
+
+    Callers that arrive while a computation for their key is running await the
+    same task instead of starting another. At most ``max_pending`` distinct
+    computations run at once; past that, ``run`` raises ``Overloaded``. The task
+    is shielded, so one caller disconnecting doesn't cancel it for the others.
+    """
+
+    def __init__(self, max_pending: int = 32, retry_after: int = 2):
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            if len(self._tasks) >= self.max_pending:
+                raise Overloaded(self.retry_after)
+            task = self._tasks[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, so an error nobody awaited isn't logged twice
+
+
+computations = SingleFlight(
+    max_pending=int(os.getenv("MAX_PENDING_COMPUTATIONS", "32")),
+    retry_after=int(os.getenv("OVERLOAD_RETRY_AFTER", "2")),
+)
+
+
+async def cached_computation(cache: VersionedCache, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    ``cache[key]`` if it is current, otherwise the result of ``compute()``,
+    shared with every concurrent caller asking for the same key and version.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    version = get_data_version()
+
+    async def compute_and_store():
+        result = await compute()
+        cache.set(key, result, version=version)
+        return result
+
+    return await computations.run((current_group(), key, version), compute_and_store)
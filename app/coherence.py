@@ -0,0 +1,114 @@
+"""
+Version counters shared by every worker process.
+
+The in-process caches (leaderboard pages, API bodies, authorization state) are
+keyed on two counters: the data version, bumped after every write, and the
+authorization revision, bumped after every authorize/deauthorize. With several
+workers a bump in one process has to be visible to the others at once, so the
+counters live in a small memory-mapped file next to the database. Reads are a
+plain 8-byte load from shared memory; increments take an ``flock`` on the file.
+
+The file outlives restarts, so the counters only ever move forward.
+
+Each saving group has its own counters file next to its shard, so a write in
+one group doesn't invalidate the caches of the others. ``shared_counters``
+returns the current group's. The file descriptor is closed once the file is
+mapped and only reopened for an increment, so hundreds of groups don't hold
+hundreds of open files.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+
+from app.settings import DEFAULT_GROUP, GROUP_ID_PATTERN, SHARD_DIR, current_group
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process is all we support there
+    fcntl = None
+
+COUNTERS_FILE = os.getenv("CACHE_COUNTERS_FILE", os.getenv("SQLITE_FILE", "savings.db") + "-counters")
+
+DATA_VERSION = 0
+AUTH_REVISION = 1
+_SLOTS = 2
+_SLOT = struct.Struct("<q")
+
+
+class SharedCounters:
+    def __init__(self, path: str):
+        self.path = path
+        self._mm = None
+        self._lock = threading.Lock()  # flock is per process, not per thread
+
+    def _open(self):
+        with self._lock:
+            if self._mm is not None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                self._locked(fd, lambda: self._initialise(fd))
+                self._mm = mmap.mmap(fd, _SLOTS * _SLOT.size)
+            finally:
+                os.close(fd)  # the mapping stays valid
+
+    def _initialise(self, fd: int):
+        if os.fstat(fd).st_size >= _SLOTS * _SLOT.size:
+            return
+        # New file: start the revision from the clock so session tokens signed
+        # against an older (deleted) counter file never look current.
+        initial = [0] * _SLOTS
+        initial[AUTH_REVISION] = time.time_ns()
+        os.write(fd, b"".join(_SLOT.pack(value) for value in initial))
+
+    @staticmethod
+    def _locked(fd: int, fn):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            return fn()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def get(self, slot: int) -> int:
+        if self._mm is None:
+            self._open()
+        return _SLOT.unpack_from(self._mm, slot * _SLOT.size)[0]
+
+    def increment(self, slot: int) -> int:
+        if self._mm is None:
+            self._open()
+
+        def bump():
+            value = _SLOT.unpack_from(self._mm, slot * _SLOT.size)[0] + 1
+            _SLOT.pack_into(self._mm, slot * _SLOT.size, value)
+            return value
+
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR)
+            try:
+                return self._locked(fd, bump)
+            finally:
+                os.close(fd)
+
+
+_group_counters = {DEFAULT_GROUP: SharedCounters(COUNTERS_FILE)}
+_group_counters_lock = threading.Lock()
+
+
+def shared_counters() -> SharedCounters:
+    # The counters of the group the caller runs for (see app.settings.use_group)
+    group_id = current_group()
+    counters = _group_counters.get(group_id)
+    if counters is None:
+        if not GROUP_ID_PATTERN.fullmatch(group_id):
+            raise ValueError(f"Invalid group id: {group_id!r}")
+        with _group_counters_lock:
+            counters = _group_counters.setdefault(
+                group_id, SharedCounters(os.path.join(SHARD_DIR, f"{group_id}.db-counters"))
+            )
+    return counters
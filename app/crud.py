@@ -1,29 +1,73 @@
-from sqlmodel import select
-from app.models import User, AuthorizedUser, Deposit
-from app.database import get_session
-from typing import Optional
-from datetime import date 
-def get_user_by_username(username: str):
-    with get_session() as session:
+from sqlalchemy import case, delete, insert, literal, text, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select, func
+from app.models import User, AuthorizedUser, Deposit, DepositArchive, MemberStats, ReminderOutbox, WeeklyDeposit
+from app import database
+from app.database import begin_write, get_session, session_scope
+from app.cache import bump_data_version
+from app.auth import revoke_authorization_state
+from app.streaks import build_week_matrix
+from app.utils import get_saving_calendar, compute_streak_stats
+from typing import Iterable, Iterator, NamedTuple, Optional
+from datetime import date, datetime, timedelta
+import sys
+def get_user_by_username(username: str, session: Optional[Session] = None):
+    with session_scope(session) as session:
         statement = select(User).where(User.username == username)
         result = session.exec(statement).first()
         return result
 
-def create_user(username: str, password: str):
-    with get_session() as session:
+def create_user(username: str, password: str, session: Optional[Session] = None):
+    with session_scope(session) as session:
         user = User(username=username, password=password)
         session.add(user)
         session.commit()
         session.refresh(user)
         return user
 
-def is_authorized(username: str):
-    with get_session() as session:
-        statement = select(AuthorizedUser).where(AuthorizedUser.username == username)
-        return session.exec(statement).first() is not None
+# Read projections for the hot routes select only the columns the page uses
+# and run as Core statements on the session's connection: no ORM objects are
+# built, validated or tracked in the identity map. Rows come back as the
+# NamedTuples below, or as parallel columns for the leaderboard.
+
+class UserLogin(NamedTuple):
+    id: int
+    username: str
+    password: str
+    authorized: bool
+
+class RecentDeposit(NamedTuple):
+    amount: float
+    week_date: Optional[date]
+    timestamp: datetime
+
+class LeaderboardColumns(NamedTuple):
+    # Parallel tuples, highest total first
+    usernames: tuple[str, ...]
+    total_saved: tuple[float, ...]
+    max_streaks: tuple[int, ...]
+
+def _read(session: Session, statement):
+    return session.connection().execute(statement)
 
-def update_user_password(username: str, new_password: str):
-    with get_session() as session:
+def is_authorized(username: str, session: Optional[Session] = None):
+    with session_scope(session) as session:
+        statement = select(AuthorizedUser.id).where(AuthorizedUser.username == username)
+        return _read(session, statement).first() is not None
+
+def get_user_with_authorization(username: str, session: Optional[Session] = None) -> Optional[UserLogin]:
+    # The user and whether they are authorized in one LEFT JOIN, or None if the user doesn't exist
+    with session_scope(session) as session:
+        statement = (
+            select(User.id, User.username, User.password, AuthorizedUser.id.is_not(None))
+            .join(AuthorizedUser, AuthorizedUser.username == User.username, isouter=True)
+            .where(User.username == username)
+        )
+        row = _read(session, statement).first()
+        return UserLogin._make(row) if row else None
+
+def update_user_password(username: str, new_password: str, session: Optional[Session] = None):
+    with session_scope(session) as session:
         statement = select(User).where(User.username == username)
         result = session.exec(statement)
         user = result.first()
@@ -32,13 +76,17 @@ def update_user_password(username: str, new_password: str):
             session.add(user)
             session.commit()
 
-def get_all_users():
-    with get_session() as session:
+def get_all_users(session: Optional[Session] = None):
+    with session_scope(session) as session:
         statement = select(User)
         return session.exec(statement).all()
 
-def authorize_user(username: str):
-    with get_session() as session:
+def get_authorized_usernames(session: Optional[Session] = None):
+    with session_scope(session) as session:
+        return session.exec(select(AuthorizedUser.username)).all()
+
+def authorize_user(username: str, session: Optional[Session] = None):
+    with session_scope(session) as session:
         # Check if already authorized
         statement = select(AuthorizedUser).where(AuthorizedUser.username == username)
         if session.exec(statement).first():
@@ -46,24 +94,539 @@ def authorize_user(username: str):
         auth_user = AuthorizedUser(username=username)
         session.add(auth_user)
         session.commit()
+    revoke_authorization_state(username)
+    bump_data_version()
 
-def deauthorize_user(username: str):
-    with get_session() as session:
+def deauthorize_user(username: str, session: Optional[Session] = None):
+    with session_scope(session) as session:
         statement = select(AuthorizedUser).where(AuthorizedUser.username == username)
         user = session.exec(statement).first()
         if user:
             session.delete(user)
             session.commit()
+            revoke_authorization_state(username)
+            bump_data_version()
+
+def set_authorization(usernames: Iterable[str], authorized: bool, session: Optional[Session] = None) -> int:
+    """
+    Authorizes (or deauthorizes) many users in one transaction.
+
+    Unknown usernames are ignored. Returns how many users actually changed.
+    """
+    usernames = sorted(set(usernames))
+    if not usernames:
+        return 0
+    with session_scope(session) as session:
+        connection = session.connection()
+        if authorized:
+            existing = select(User.username).where(User.username.in_(usernames))
+            result = connection.execute(
+                insert(AuthorizedUser).prefix_with("OR IGNORE").from_select(["username"], existing)
+            )
+        else:
+            result = connection.execute(delete(AuthorizedUser).where(AuthorizedUser.username.in_(usernames)))
+        session.commit()
+        changed = result.rowcount
+    if changed:
+        for username in usernames:
+            revoke_authorization_state(username)
+        bump_data_version()
+    return changed
+
+
+class UserPage(NamedTuple):
+    rows: list[tuple[int, str, bool]]  # (id, username, authorized)
+    next_after: Optional[str]  # pass as `after` for the next page, None on the last one
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    # Smallest string greater than every string starting with `prefix`, or None
+    # when there is none. U+10FFFF has no successor, so it is dropped and the
+    # character before it is bumped instead.
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search_users(
+    query: str = "",
+    contains: bool = False,
+    status: Optional[bool] = None,
+    after: Optional[str] = None,
+    limit: int = 50,
+    session: Optional[Session] = None,
+) -> UserPage:
+    """
+    One page of users ordered by username, with authorization status from a
+    single LEFT JOIN.
 
+    ``query`` is a username prefix (a range scan on the unique username index),
+    or with ``contains`` a substring matched through the trigram FTS5 index;
+    substrings shorter than three characters, or a SQLite without FTS5, fall back
+    to LIKE. ``status`` keeps only authorized (True) or unauthorized (False)
+    users. Pages are keyset-paginated on username: pass the previous page's
+    ``next_after`` as ``after``.
+    """
+    statement = (
+        select(User.id, User.username, AuthorizedUser.id.is_not(None))
+        .join(AuthorizedUser, AuthorizedUser.username == User.username, isouter=True)
+    )
+    if query and not contains:
+        statement = statement.where(User.username >= query)
+        upper_bound = _prefix_upper_bound(query)
+        if upper_bound is not None:
+            statement = statement.where(User.username < upper_bound)
+    elif query and len(query) >= 3 and database.user_search_enabled:
+        phrase = '"' + query.replace('"', '""') + '"'
+        matches = text("SELECT rowid FROM user_search WHERE user_search MATCH :phrase").bindparams(phrase=phrase)
+        statement = statement.where(User.id.in_(matches))
+    elif query:
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        statement = statement.where(User.username.like(pattern, escape="\\"))
+    if status is not None:
+        statement = statement.where(AuthorizedUser.id.is_not(None) if status else AuthorizedUser.id.is_(None))
+    if after is not None:
+        statement = statement.where(User.username > after)
 
-def save_deposit(username: str, amount: float, week_date: Optional[date] = None):
-    with get_session() as session:
+    with session_scope(session) as session:
+        rows = session.exec(statement.order_by(User.username).limit(limit + 1)).all()
+    rows = [(user_id, username, bool(authorized)) for user_id, username, authorized in rows]
+    if len(rows) > limit:
+        return UserPage(rows[:limit], rows[limit - 1][1])
+    return UserPage(rows, None)
+
+
+class BulkDepositResult(NamedTuple):
+    allocations: list[tuple[date, float]]  # what was actually saved
+    unpaid_weeks: list[date]  # elapsed weeks still unpaid after the write
+    stats: Optional[tuple[float, int, int]] = None  # (total_saved, current_streak, max_streak) after it
+
+
+def save_deposit(username: str, amount: float, week_date: Optional[date] = None, session: Optional[Session] = None):
+    with session_scope(session) as session:
         deposit = Deposit(username=username, amount=amount, week_date=week_date)
         session.add(deposit)
+        paid_weeks = _load_paid_weeks(session, username) if week_date and amount > 0 else None
+        _update_member_stats(session, username, [(week_date, amount)], paid_weeks)
+        session.commit()
+    bump_data_version()
+
+def save_deposits_bulk(
+    username: str,
+    allocations: list[tuple[Optional[date], float]],
+    today: Optional[date] = None,
+    session: Optional[Session] = None,
+) -> BulkDepositResult:
+    """
+    Saves several week allocations for one member in a single transaction.
+
+    An allocation whose week is None goes to the member's first unpaid elapsed
+    week, and is dropped if there is none. The member's paid weeks are read once
+    and reused for the stats update and for the returned unpaid weeks.
+    """
+    with session_scope(session) as session:
+        result = _add_deposits(session, username, allocations, today or date.today())
+        if result.allocations:
+            session.commit()
+            bump_data_version()
+    return result
+
+def save_deposit_batch(
+    requests: list[tuple[str, list[tuple[Optional[date], float]], date]],
+    session: Optional[Session] = None,
+) -> list:
+    """
+    Group commit: saves several (username, allocations, today) deposit requests
+    in one transaction, in order.
+
+    Each request runs in its own savepoint, so one that fails is rolled back on
+    its own. Returns, per request, its BulkDepositResult or the exception it
+    raised. If the final commit fails, that exception is raised instead and
+    nothing was saved.
+    """
+    results = []
+    with session_scope(session) as session:
+        begin_write(session)
+        for username, allocations, today in requests:
+            try:
+                with session.begin_nested():
+                    results.append(_add_deposits(session, username, allocations, today))
+            except Exception as e:
+                results.append(e)
+        session.commit()
+    if any(isinstance(result, BulkDepositResult) and result.allocations for result in results):
+        bump_data_version()
+    return results
+
+def _add_deposits(
+    session: Session, username: str, allocations: list[tuple[Optional[date], float]], today: date
+) -> BulkDepositResult:
+    # save_deposits_bulk without the commit
+    calendar = get_saving_calendar()
+    paid_weeks = _load_paid_weeks(session, username)
+    paid = calendar.bitmap(paid_weeks)
+    saved = []
+    for week_date, amount in allocations:
+        if week_date is None:
+            week_date = calendar.first_unpaid_week(paid, today)
+            if week_date is None:
+                continue
+        session.add(Deposit(username=username, amount=amount, week_date=week_date))
+        if amount > 0:
+            paid_weeks.add(week_date)
+            index = calendar.index_of(week_date)
+            if index is not None:
+                paid |= 1 << index
+        saved.append((week_date, amount))
+
+    stats = None
+    if saved:
+        member = _update_member_stats(session, username, saved, paid_weeks)
+        stats = (member.total_saved, member.current_streak, member.max_streak)
+    return BulkDepositResult(saved, calendar.unpaid_weeks(paid, today), stats)
+
+def _ledger(username: Optional[str] = None):
+    # Every allocation as (username, week_date, amount, count): the rollups of
+    # compacted weeks plus the raw rows still in Deposit. SQLite pushes filters
+    # on it down into both halves, so each uses its own index.
+    hot = select(Deposit.username, Deposit.week_date, Deposit.amount, literal(1).label("count"))
+    rolled_up = select(WeeklyDeposit.username, WeeklyDeposit.week_date, WeeklyDeposit.amount, WeeklyDeposit.count)
+    if username is not None:
+        hot = hot.where(Deposit.username == username)
+        rolled_up = rolled_up.where(WeeklyDeposit.username == username)
+    return union_all(hot, rolled_up).subquery("ledger")
+
+def _load_paid_weeks(session: Session, username: str) -> set[date]:
+    ledger = _ledger(username)
+    statement = select(ledger.c.week_date).where(ledger.c.week_date.is_not(None), ledger.c.amount > 0).distinct()
+    return set(session.exec(statement).all())
+
+def _update_member_stats(
+    session: Session,
+    username: str,
+    allocations: list[tuple[Optional[date], float]],
+    paid_weeks: Optional[set[date]],
+) -> MemberStats:
+    # Runs inside the caller's transaction. paid_weeks must already include the
+    # new allocations; it is only needed when one of them pays a week.
+    stats = session.exec(select(MemberStats).where(MemberStats.username == username)).first()
+    if stats is None:
+        stats = MemberStats(username=username)
+    stats.total_saved += sum(amount for _, amount in allocations)
+    stats.deposit_count += len(allocations)
+    new_weeks = [week_date for week_date, amount in allocations if week_date and amount > 0]
+    if new_weeks:
+        latest = max(new_weeks)
+        if stats.last_week_paid is None or latest > stats.last_week_paid:
+            stats.last_week_paid = latest
+        stats.current_streak, stats.max_streak = compute_streak_stats(paid_weeks)
+    session.add(stats)
+    return stats
+
+def import_deposits(rows: Iterable[dict], batch_size: int = 1000, session: Optional[Session] = None) -> int:
+    """
+    Loads historical deposits in batched transactions and rebuilds MemberStats.
+
+    Each row needs username and amount, and may carry week_date and timestamp.
+
+    Returns:
+        int: Number of deposits inserted.
+    """
+    inserted = 0
+    batch = []
+    with session_scope(session) as session:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                session.execute(insert(Deposit), batch)
+                session.commit()
+                inserted += len(batch)
+                batch = []
+        if batch:
+            session.execute(insert(Deposit), batch)
+            session.commit()
+            inserted += len(batch)
+        if inserted:
+            rebuild_member_stats(session=session)
+    return inserted
+
+def get_member_stats(username: str, session: Optional[Session] = None):
+    with session_scope(session) as session:
+        statement = select(MemberStats).where(MemberStats.username == username)
+        return session.exec(statement).first()
+
+def get_all_member_stats(session: Optional[Session] = None):
+    with session_scope(session) as session:
+        statement = select(MemberStats).order_by(MemberStats.total_saved.desc())
+        return session.exec(statement).all()
+
+def get_total_saved(username: str, session: Optional[Session] = None) -> float:
+    with session_scope(session) as session:
+        statement = select(MemberStats.total_saved).where(MemberStats.username == username)
+        return _read(session, statement).scalar() or 0
+
+def get_leaderboard_columns(session: Optional[Session] = None) -> LeaderboardColumns:
+    with session_scope(session) as session:
+        statement = (
+            select(MemberStats.username, MemberStats.total_saved, MemberStats.max_streak)
+            .order_by(MemberStats.total_saved.desc())
+        )
+        rows = _read(session, statement).all()
+    return LeaderboardColumns(*zip(*rows)) if rows else LeaderboardColumns((), (), ())
+
+def get_week_amounts(username: str, session: Optional[Session] = None):
+    # (week_date, total amount) per paid week, summed by SQLite
+    ledger = _ledger(username)
+    with session_scope(session) as session:
+        statement = (
+            select(ledger.c.week_date, func.sum(ledger.c.amount))
+            .where(ledger.c.week_date.is_not(None))
+            .group_by(ledger.c.week_date)
+            .order_by(ledger.c.week_date)
+        )
+        return _read(session, statement).all()
+
+def get_recent_deposits(username: str, limit: int = 5, session: Optional[Session] = None) -> list[RecentDeposit]:
+    # Newest first, archived ones included: a late deposit to an old week can
+    # be archived while still among the member's latest
+    with session_scope(session) as session:
+        deposits = []
+        for model in (Deposit, DepositArchive):
+            statement = (
+                select(model.amount, model.week_date, model.timestamp)
+                .where(model.username == username)
+                .order_by(model.timestamp.desc())
+                .limit(limit)
+            )
+            deposits += map(RecentDeposit._make, _read(session, statement))
+        return sorted(deposits, key=lambda deposit: deposit.timestamp, reverse=True)[:limit]
+
+def rebuild_member_stats(session: Optional[Session] = None) -> list[str]:
+    """
+    Recomputes MemberStats from the deposit ledger (rollups plus recent rows).
+
+    Returns:
+        list[str]: Usernames whose stored aggregates differed from the rebuilt ones.
+    """
+    ledger = _ledger()
+    with session_scope(session) as session:
+        totals = session.exec(
+            select(
+                ledger.c.username,
+                func.sum(ledger.c.amount),
+                func.sum(ledger.c.count),
+                func.max(case((ledger.c.amount > 0, ledger.c.week_date))),
+            ).group_by(ledger.c.username)
+        ).all()
+        matrix = build_week_matrix(
+            session.exec(select(ledger.c.username, ledger.c.week_date, ledger.c.amount)),
+            get_saving_calendar().weeks,
+        )
+
+        existing = {s.username: s for s in session.exec(select(MemberStats)).all()}
+        drifted = []
+        for username, total_saved, deposit_count, last_week_paid in totals:
+            row = matrix.rows.get(username)
+            fresh = (
+                round(total_saved, 2),
+                deposit_count,
+                last_week_paid,
+                matrix.current_streaks[row] if row is not None else 0,
+                matrix.max_streaks[row] if row is not None else 0,
+            )
+            stats = existing.pop(username, None) or MemberStats(username=username)
+            stored = (
+                round(stats.total_saved, 2),
+                stats.deposit_count,
+                stats.last_week_paid,
+                stats.current_streak,
+                stats.max_streak,
+            )
+            if stats.id is None or stored != fresh:
+                drifted.append(username)
+            stats.total_saved = total_saved
+            stats.deposit_count = deposit_count
+            stats.last_week_paid, stats.current_streak, stats.max_streak = fresh[2:]
+            session.add(stats)
+
+        # Members that no longer have any deposits
+        for username, stats in existing.items():
+            drifted.append(username)
+            session.delete(stats)
+
+        session.commit()
+    bump_data_version()
+    return drifted
+
+def ensure_member_stats(session: Optional[Session] = None):
+    # Backfills the aggregates table for databases created before it existed.
+    with session_scope(session) as session:
+        has_stats = session.exec(select(MemberStats.id).limit(1)).first() is not None
+        has_deposits = session.exec(select(Deposit.id).limit(1)).first() is not None
+        if has_deposits and not has_stats:
+            rebuild_member_stats(session=session)
+
+def iter_deposit_pages(
+    username: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    page_size: int = 1000,
+) -> Iterator[list[tuple]]:
+    """
+    Yields the deposit ledger in pages of (id, username, amount, week_date, timestamp),
+    archived rows included, in id order.
+
+    Uses keyset pagination on id and a fresh short-lived session per page, so
+    memory stays flat and no read transaction is held open between pages.
+    start_date/end_date filter on week_date (inclusive).
+    """
+    last_id = 0
+    while True:
+        page = []
+        with get_session() as session:
+            # A page of each table, merged; ids are unique across both
+            for model in (Deposit, DepositArchive):
+                statement = select(
+                    model.id, model.username, model.amount, model.week_date, model.timestamp
+                ).where(model.id > last_id)
+                if username:
+                    statement = statement.where(model.username == username)
+                if start_date:
+                    statement = statement.where(model.week_date >= start_date)
+                if end_date:
+                    statement = statement.where(model.week_date <= end_date)
+                page += session.exec(statement.order_by(model.id).limit(page_size)).all()
+        page = sorted(page, key=lambda row: row[0])[:page_size]
+        if not page:
+            return
+        yield page
+        last_id = page[-1][0]
+
+def get_paid_week_dates(username: str, session: Optional[Session] = None):
+    ledger = _ledger(username)
+    with session_scope(session) as session:
+        statement = select(ledger.c.week_date).where(ledger.c.week_date.is_not(None)).distinct()
+        return _read(session, statement).scalars().all()
+
+def get_authorized_paid_weeks(before: date, session: Optional[Session] = None):
+    """
+    (username, week_date) for every authorized member and every week they paid
+    before ``before``, in one query. Members with no such deposit still appear
+    once, with week_date None.
+    """
+    ledger = _ledger()
+    with session_scope(session) as session:
+        statement = (
+            select(AuthorizedUser.username, ledger.c.week_date)
+            .join(
+                ledger,
+                (ledger.c.username == AuthorizedUser.username)
+                & (ledger.c.amount > 0)
+                & (ledger.c.week_date < before),
+                isouter=True,
+            )
+            .group_by(AuthorizedUser.username, ledger.c.week_date)
+        )
+        return session.exec(statement).all()
+
+def queue_reminders(rows: list[dict], session: Optional[Session] = None) -> int:
+    # INSERT OR IGNORE on (username, week_date): reminders already queued for
+    # that week are skipped. Returns how many rows were new.
+    if not rows:
+        return 0
+    with session_scope(session) as session:
+        # On the connection: Session.execute doesn't expose executemany rowcounts
+        result = session.connection().execute(insert(ReminderOutbox).prefix_with("OR IGNORE"), rows)
         session.commit()
+        return result.rowcount
+
+def get_unsent_reminders(week_date: date, limit: int, session: Optional[Session] = None):
+    with session_scope(session) as session:
+        statement = (
+            select(ReminderOutbox)
+            .where(ReminderOutbox.week_date == week_date, ReminderOutbox.sent_at.is_(None))
+            .order_by(ReminderOutbox.id)
+            .limit(limit)
+        )
+        return session.exec(statement).all()
 
-def get_paid_week_dates(username: str):
-    with get_session() as session:
-        statement = select(Deposit).where(Deposit.username == username)
-        deposits = session.exec(statement).all()
-        return [d.week_date for d in deposits if d.week_date]
+def mark_reminders_sent(ids: list[int], sent_at: datetime, session: Optional[Session] = None):
+    with session_scope(session) as session:
+        session.execute(update(ReminderOutbox).where(ReminderOutbox.id.in_(ids)).values(sent_at=sent_at))
+        session.commit()
+
+def backfill_week_dates(session: Optional[Session] = None) -> int:
+    """
+    Sets week_date on legacy deposits that only have a week_number (week 1 is
+    START_DATE), one UPDATE per week number. Returns how many rows changed.
+    """
+    start_date = get_saving_calendar().start_date
+    updated = 0
+    with session_scope(session) as session:
+        week_numbers = session.exec(
+            select(Deposit.week_number)
+            .where(Deposit.week_date.is_(None), Deposit.week_number.is_not(None))
+            .distinct()
+        ).all()
+        for week_number in week_numbers:
+            result = session.execute(
+                update(Deposit)
+                .where(Deposit.week_date.is_(None), Deposit.week_number == week_number)
+                .values(week_date=start_date + timedelta(weeks=week_number - 1))
+            )
+            updated += result.rowcount
+        session.commit()
+    return updated
+
+class LedgerCompaction(NamedTuple):
+    backfilled: int  # legacy rows given a week_date
+    weeks: int  # weeks compacted
+    archived: int  # Deposit rows moved to DepositArchive
+
+def compact_ledger(before: date, session: Optional[Session] = None) -> LedgerCompaction:
+    """
+    Rolls every deposit of a week starting before ``before`` up into
+    WeeklyDeposit and moves the raw rows to DepositArchive, one transaction per
+    week. Legacy rows are backfilled first so they get compacted too.
+
+    Late deposits to a compacted week stay in Deposit until the next run, which
+    adds them to the existing rollup; reads combine both meanwhile. The newest
+    Deposit row is never moved, so SQLite can't hand its id out again and ids
+    stay unique across both tables.
+    """
+    backfilled = backfill_week_dates(session=session)
+    weeks = archived = 0
+    with session_scope(session) as session:
+        week_dates = session.exec(
+            select(Deposit.week_date).where(Deposit.week_date < before).distinct().order_by(Deposit.week_date)
+        ).all()
+        session.commit()
+        for week_date in week_dates:
+            in_week = (Deposit.week_date == week_date) & (Deposit.id < select(func.max(Deposit.id)).scalar_subquery())
+            rollup = sqlite_insert(WeeklyDeposit).from_select(
+                ["username", "week_date", "amount", "count"],
+                select(Deposit.username, Deposit.week_date, func.sum(Deposit.amount), func.count())
+                .where(in_week)
+                .group_by(Deposit.username),
+            )
+            session.execute(rollup.on_conflict_do_update(
+                index_elements=["username", "week_date"],
+                set_={
+                    "amount": WeeklyDeposit.amount + rollup.excluded.amount,
+                    "count": WeeklyDeposit.count + rollup.excluded.count,
+                },
+            ))
+            session.execute(insert(DepositArchive).from_select(
+                ["id", "username", "amount", "timestamp", "week_date"],
+                select(Deposit.id, Deposit.username, Deposit.amount, Deposit.timestamp, Deposit.week_date)
+                .where(in_week),
+            ))
+            moved = session.execute(delete(Deposit).where(in_week)).rowcount
+            session.commit()
+            weeks += moved > 0
+            archived += moved
+        if backfilled:
+            # Those rows now pay a week, which changes streaks
+            rebuild_member_stats(session=session)
+    return LedgerCompaction(backfilled, weeks, archived)
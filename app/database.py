@@ -1,13 +1,263 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, fields, replace
+from typing import AsyncIterator, Iterator, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from sqlmodel import SQLModel, create_engine, Session
-from app.models import User, AuthorizedUser
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.metrics import record_query
+from app.settings import DEFAULT_GROUP, GROUP_ID_PATTERN, SHARD_DIR, current_group
 
-sqlite_file_name = "savings.db"
+sqlite_file_name = os.getenv("SQLITE_FILE", "savings.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-engine = create_engine(sqlite_url, echo=False)
+
+@dataclass(frozen=True)
+class EngineProfile:
+    """
+    SQLite connection tuning applied to every pooled connection.
+
+    Each field can be overridden with an environment variable named after it in
+    upper case with a ``SQLITE_`` prefix, e.g. ``SQLITE_JOURNAL_MODE=DELETE``.
+    """
+    journal_mode: str = "WAL"  # readers no longer block behind a writer
+    synchronous: str = "NORMAL"  # durable in WAL mode, one fsync per checkpoint
+    mmap_size: int = 64 * 1024 * 1024
+    cache_size: int = -16000  # negative = KiB, so ~16 MB page cache per connection
+    busy_timeout: int = 5000  # ms to wait for the write lock instead of failing
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_timeout: int = 30
+
+    @classmethod
+    def from_env(cls) -> "EngineProfile":
+        overrides = {}
+        for f in fields(cls):
+            value = os.getenv(f"SQLITE_{f.name.upper()}")
+            if value is not None:
+                overrides[f.name] = f.type(value) if f.type in (int, "int") else value
+        return cls(**overrides)
+
+
+def apply_pragmas(sync_engine, profile: EngineProfile):
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={profile.journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={profile.synchronous}")
+        cursor.execute(f"PRAGMA mmap_size={profile.mmap_size}")
+        cursor.execute(f"PRAGMA cache_size={profile.cache_size}")
+        cursor.execute(f"PRAGMA busy_timeout={profile.busy_timeout}")
+        cursor.close()
+
+
+def instrument_queries(sync_engine):
+    # Times every statement and reports it to app.metrics for /metrics. The
+    # start time lives on the statement's own execution context: a statement
+    # that raises never reaches after_cursor_execute, and must not leave
+    # anything behind on the pooled connection.
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started_at = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+        started_at = getattr(context, "_query_started_at", None)
+        if started_at is not None:
+            record_query(time.perf_counter() - started_at)
+
+
+def make_engine(url: str, profile: EngineProfile):
+    new_engine = create_engine(
+        url,
+        echo=False,
+        connect_args={"check_same_thread": False},
+        pool_size=profile.pool_size,
+        max_overflow=profile.max_overflow,
+        pool_timeout=profile.pool_timeout,
+    )
+    apply_pragmas(new_engine, profile)
+    instrument_queries(new_engine)
+    return new_engine
+
+
+def make_async_engine(url: str, profile: EngineProfile):
+    # Imported here so the sync-only setup doesn't need aiosqlite installed
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    new_engine = create_async_engine(
+        url,
+        echo=False,
+        pool_size=profile.pool_size,
+        max_overflow=profile.max_overflow,
+        pool_timeout=profile.pool_timeout,
+    )
+    apply_pragmas(new_engine.sync_engine, profile)
+    instrument_queries(new_engine.sync_engine)
+    return new_engine
+
+
+engine_profile = EngineProfile.from_env()
+engine = make_engine(sqlite_url, engine_profile)
+
+# DB_ASYNC=true serves the async routes from an aiosqlite engine; otherwise they
+# run the sync crud functions in the threadpool. Both share the same database file.
+USE_ASYNC_DB = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+async_engine = make_async_engine(f"sqlite+aiosqlite:///{sqlite_file_name}", engine_profile) if USE_ASYNC_DB else None
+
+# Trigram FTS5 index over User.username for substring search in the admin panel,
+# kept in sync by triggers. Needs SQLite >= 3.34 built with FTS5.
+USER_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE user_search USING fts5(
+        username, content='user', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON "user" BEGIN
+        INSERT INTO user_search(rowid, username) VALUES (new.id, new.username);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON "user" BEGIN
+        INSERT INTO user_search(user_search, rowid, username) VALUES ('delete', old.id, old.username);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF username ON "user" BEGIN
+        INSERT INTO user_search(user_search, rowid, username) VALUES ('delete', old.id, old.username);
+        INSERT INTO user_search(rowid, username) VALUES (new.id, new.username);
+    END""",
+    "INSERT INTO user_search(user_search) VALUES ('rebuild')",
+)
+
+def create_user_search_index(connection) -> bool:
+    # Returns whether trigram search is available
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'"
+    ).first()
+    if exists:
+        return True
+    try:
+        for statement in USER_SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+    except OperationalError:
+        return False  # no FTS5 / trigram tokenizer: search falls back to LIKE
+    return True
+
+def create_tables(target_engine: Engine) -> bool:
+    # Returns whether trigram search is available
+    SQLModel.metadata.create_all(target_engine)
+    # create_all skips indexes on tables that already exist, so add any new ones
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(target_engine, checkfirst=True)
+    with target_engine.begin() as connection:
+        return create_user_search_index(connection)
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    global user_search_enabled
+    user_search_enabled = create_tables(engine)
+
+user_search_enabled = False  # set by create_db_and_tables
+
+# Every saving group other than the default one lives in its own SQLite file
+# under SHARD_DIR. Shard engines are opened on first use and kept in an LRU of
+# SHARD_POOL_SIZE; the least recently used one is disposed when it overflows,
+# so hundreds of groups cost only as many open files as are actually busy.
+SHARD_POOL_SIZE = int(os.getenv("SHARD_POOL_SIZE", "64"))
+
+# Shards are small and mostly idle: fewer pooled connections and a smaller page cache each
+shard_profile = replace(engine_profile, pool_size=2, max_overflow=8, cache_size=-2000)
+
+class ShardPool:
+    def __init__(self, directory: str, size: int, profile: EngineProfile):
+        self.directory = directory
+        self.size = size
+        self.profile = profile
+        self._engines: OrderedDict[str, Engine] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, group_id: str) -> str:
+        if not GROUP_ID_PATTERN.fullmatch(group_id):
+            raise ValueError(f"Invalid group id: {group_id!r}")
+        return os.path.join(self.directory, f"{group_id}.db")
+
+    def get(self, group_id: str) -> Engine:
+        with self._lock:
+            shard = self._engines.get(group_id)
+            if shard is not None:
+                self._engines.move_to_end(group_id)
+                return shard
+
+        # Opened outside the lock; a racing thread's engine is simply dropped
+        os.makedirs(self.directory, exist_ok=True)
+        shard = make_engine(f"sqlite:///{self.path(group_id)}", self.profile)
+        create_tables(shard)
+        with self._lock:
+            existing = self._engines.get(group_id)
+            if existing is not None:
+                shard.dispose()
+                return existing
+            self._engines[group_id] = shard
+            while len(self._engines) > self.size:
+                _, evicted = self._engines.popitem(last=False)
+                evicted.dispose()  # checked-out connections close when they come back
+        return shard
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+shard_pool = ShardPool(SHARD_DIR, SHARD_POOL_SIZE, shard_profile)
+
+def current_engine() -> Engine:
+    # The engine of the group this request / block runs for (see use_group)
+    group_id = current_group()
+    return engine if group_id == DEFAULT_GROUP else shard_pool.get(group_id)
 
 def get_session():
-    return Session(engine)
+    return Session(current_engine())
+
+def get_db() -> Iterator[Session]:
+    # FastAPI dependency: one session shared by every crud call in a request.
+    # Objects stay readable after a commit so later calls don't reload them.
+    with Session(current_engine(), expire_on_commit=False) as session:
+        yield session
+
+@contextmanager
+def session_scope(session: Optional[Session] = None) -> Iterator[Session]:
+    # Reuses the caller's session, or opens (and closes) a short-lived one.
+    if session is not None:
+        yield session
+    else:
+        with get_session() as new_session:
+            yield new_session
+
+def begin_write(session: Session):
+    # Opens the SQLite transaction now, holding the write lock, unless one is
+    # already open. pysqlite (and aiosqlite) only emit BEGIN implicitly before
+    # INSERT/UPDATE/DELETE, never before SAVEPOINT: a savepoint taken first
+    # would run in autocommit mode and its RELEASE would commit on its own.
+    connection = session.connection()
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+# What the async routes receive: see get_async_db
+AsyncDbSession = Union[Session, AsyncSession]
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[AsyncDbSession]:
+    # An AsyncSession when DB_ASYNC is on, or a regular Session for
+    # app.async_crud to run in the threadpool. Group shards always get the
+    # latter.
+    if async_engine is None or current_group() != DEFAULT_GROUP:
+        with Session(current_engine(), expire_on_commit=False) as session:
+            yield session
+    else:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+async def get_async_db() -> AsyncIterator[AsyncDbSession]:
+    # FastAPI dependency for the async routes
+    async with async_session_scope() as session:
+        yield session
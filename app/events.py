@@ -0,0 +1,169 @@
+"""
+Live leaderboard updates pushed to browsers over Server-Sent Events.
+
+``submit_deposit`` publishes a small delta (member, amount, new total, new
+streak) once the deposit has committed. ``leaderboard_events`` holds one
+broadcaster per saving group in this process: it encodes each event once and
+fans the bytes out to a bounded queue per connected client of that group, so
+a deposit costs the same no matter how many tabs are open and nobody has to
+poll.
+
+Backpressure: when a slow client's queue is full, its pending events are
+dropped and replaced by a single ``resync``, telling the browser to refetch
+``/api/leaderboard`` (a 304 if nothing else changed). A shared ticker sends
+a heartbeat comment every ``SSE_HEARTBEAT_SECONDS`` so proxies keep idle
+streams open. The ticker also watches the shared data version, so writes
+made by another worker process (or by anything other than a deposit) still
+reach clients here as a ``resync``.
+"""
+import asyncio
+import json
+import os
+from contextlib import suppress
+from typing import AsyncIterator, NamedTuple, Optional
+
+from app.cache import Overloaded, get_data_version
+from app.settings import current_group
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "64"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "1000"))
+SSE_RETRY_MS = 5000  # how long browsers wait before reconnecting
+
+HEARTBEAT = b": ping\n\n"
+
+
+class DepositDelta(NamedTuple):
+    member: str
+    amount: float
+    total: float
+    streak: int
+    max_streak: int
+    version: int
+
+
+def encode_event(event: str, payload: dict, event_id: Optional[int] = None) -> bytes:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(payload, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Broadcaster:
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE, heartbeat: float = SSE_HEARTBEAT_SECONDS,
+                 max_clients: int = SSE_MAX_CLIENTS):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.version = 0  # last data version clients were told about
+        self._clients: set[asyncio.Queue] = set()
+        self._ticker: Optional[asyncio.Task] = None
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def publish_deposit(self, delta: DepositDelta):
+        self.version = max(self.version, delta.version)
+        self._broadcast(encode_event("deposit", delta._asdict(), delta.version))
+
+    def publish_resync(self):
+        self.version = get_data_version()
+        self._broadcast(encode_event("resync", {"version": self.version}, self.version))
+
+    def _broadcast(self, message: Optional[bytes]):
+        # Never waits: a full queue means that client is behind, so it gets one
+        # resync instead of the backlog.
+        for queue in self._clients:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                resync = encode_event("resync", {"version": self.version}, self.version)
+                queue.put_nowait(None if message is None else resync)
+
+    async def _tick(self):
+        while self._clients:
+            await asyncio.sleep(self.heartbeat)
+            if get_data_version() > self.version:
+                self.publish_resync()  # written elsewhere: another worker, the admin, an import
+            else:
+                self._broadcast(HEARTBEAT)
+
+    def subscribe(self) -> AsyncIterator[bytes]:
+        """
+        Returns one client's stream of encoded SSE messages, which ends when the
+        broadcaster closes. Raises ``Overloaded`` right away (before any response
+        is sent) when ``max_clients`` are already connected.
+        """
+        if len(self._clients) >= self.max_clients:
+            raise Overloaded(retry_after=SSE_RETRY_MS // 1000)
+        return self._stream()
+
+    async def _stream(self) -> AsyncIterator[bytes]:
+        # Registered on first iteration, so the finally always gets to run (also
+        # when the response is cancelled because the client went away). The
+        # ticker task inherits the group of the first subscriber.
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._clients.add(queue)
+        if self._ticker is None or self._ticker.done():
+            self.version = max(self.version, get_data_version())
+            self._ticker = asyncio.create_task(self._tick())
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n".encode()
+            while True:
+                message = await queue.get()
+                if message is None:
+                    return
+                yield message
+        finally:
+            self._clients.discard(queue)
+
+    async def close(self):
+        # Ends every open stream so server shutdown doesn't wait on them
+        self._broadcast(None)
+        if self._ticker is not None:
+            self._ticker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._ticker
+
+
+class GroupBroadcasters:
+    """One ``Broadcaster`` per saving group, sharing the ``SSE_MAX_CLIENTS`` limit."""
+
+    def __init__(self, max_clients: int = SSE_MAX_CLIENTS):
+        self.max_clients = max_clients
+        self._groups: dict[str, Broadcaster] = {}
+
+    @property
+    def client_count(self) -> int:
+        return sum(broadcaster.client_count for broadcaster in self._groups.values())
+
+    def _current(self) -> Broadcaster:
+        group_id = current_group()
+        broadcaster = self._groups.get(group_id)
+        if broadcaster is None:
+            # Kept once created (a few hundred bytes); its ticker stops while idle
+            broadcaster = self._groups[group_id] = Broadcaster()
+        return broadcaster
+
+    def publish_deposit(self, delta: DepositDelta):
+        # To the current group's clients; nothing to do if it has none here
+        broadcaster = self._groups.get(current_group())
+        if broadcaster is not None:
+            broadcaster.publish_deposit(delta)
+
+    def subscribe(self) -> AsyncIterator[bytes]:
+        # A stream of the current group's events
+        if self.client_count >= self.max_clients:
+            raise Overloaded(retry_after=SSE_RETRY_MS // 1000)
+        return self._current().subscribe()
+
+    async def close(self):
+        for broadcaster in list(self._groups.values()):
+            await broadcaster.close()
+
+
+leaderboard_events = GroupBroadcasters()
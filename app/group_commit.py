@@ -0,0 +1,137 @@
+"""
+Optional write-behind queue for deposits, enabled with ``GROUP_COMMIT=true``.
+
+Deposits cluster around payday. With one transaction per request, every
+concurrent ``/deposit`` competes for SQLite's single write lock, and under a
+burst some of them give up with "database is locked". In group-commit mode
+``submit_deposit`` hands its write to ``deposit_writer`` instead. That is a
+bounded queue drained by a single writer task, which saves up to
+``GROUP_COMMIT_MAX_BATCH`` requests per transaction. A batch closes once it
+is full, or ``GROUP_COMMIT_MAX_DELAY_MS`` after its first request arrived.
+Each request gets its own result back only after the batch has committed.
+So there is one writer, one commit (and one WAL sync) per batch, and no lock
+contention between requests.
+
+When the queue is full, new deposits raise ``Overloaded`` (503 with
+Retry-After) instead of waiting. The writer is per process: with several
+workers each one has its own, and SQLite's busy timeout arbitrates between
+them. A batch can hold deposits of several saving groups. The writer commits
+each group's share to that group's shard.
+
+Compare both modes with ``python -m benchmarks.bench_group_commit``.
+"""
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from datetime import date
+from typing import Optional
+
+from app import async_crud
+from app.cache import Overloaded
+from app.crud import BulkDepositResult
+from app.database import async_session_scope
+from app.settings import current_group, use_group
+
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "5"))
+GROUP_COMMIT_QUEUE_SIZE = int(os.getenv("GROUP_COMMIT_QUEUE_SIZE", "1024"))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class DepositWriter:
+    def __init__(self, max_batch: int = GROUP_COMMIT_MAX_BATCH, max_delay_ms: float = GROUP_COMMIT_MAX_DELAY_MS,
+                 queue_size: int = GROUP_COMMIT_QUEUE_SIZE):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.queue_size = queue_size
+        self.batches = 0  # commits so far, for the benchmark and logs
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Lets the writer commit everything already queued, then ends it
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def submit(
+        self, username: str, allocations: list[tuple[Optional[date], float]], today: date
+    ) -> BulkDepositResult:
+        """
+        Queues one deposit request for the current group and waits until the
+        batch holding it has committed. Returns what ``crud.save_deposits_bulk``
+        would have.
+        """
+        if self._task is None or self._task.done():
+            raise RuntimeError("The deposit writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((current_group(), (username, allocations, today), future))
+        except asyncio.QueueFull:
+            raise Overloaded(retry_after=1)
+        return await future
+
+    async def _next_batch(self) -> tuple[list, bool]:
+        # Blocks for the first request, then collects more until the batch is
+        # full or max_delay has passed. The flag says the writer should stop.
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            by_group: dict[str, list] = {}
+            for group_id, request, future in batch:
+                by_group.setdefault(group_id, []).append((request, future))
+            for group_id, group_batch in by_group.items():
+                with use_group(group_id):
+                    await self._commit(group_batch)
+
+    async def _commit(self, batch: list):
+        try:
+            async with async_session_scope() as session:
+                results = await async_crud.save_deposit_batch([request for request, _ in batch], session=session)
+        except Exception as e:
+            logger.exception("Group commit of %d deposit(s) failed", len(batch))
+            results = [e] * len(batch)
+        self.batches += 1
+        for (_, future), result in zip(batch, results):
+            if future.done():  # the request was cancelled meanwhile
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+deposit_writer = DepositWriter()
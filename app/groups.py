@@ -0,0 +1,197 @@
+"""
+Saving groups: many independent groups served by one process.
+
+Each group has its own target, calendar and deadline, and its own SQLite
+shard (``app.database.shard_pool``). The default group is the original
+deployment: ``savings.db`` and ``global.env``. A small catalog database
+(``CATALOG_FILE``) lists the other groups and maps every username to its
+group. Usernames are unique across groups, so logging in needs only the
+username to find the shard.
+
+Requests are routed by ``GroupMiddleware``: the signed session cookie names
+the member's group, and the request runs inside ``use_group(group)``. Every
+session, setting, calendar, cache key and cache counter it touches is then
+that group's. Code outside a request picks a group the same way, e.g.
+``with use_group("climbers"): rebuild_member_stats()``.
+"""
+import os
+import threading
+from dataclasses import replace
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import insert
+from sqlmodel import Session, select
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from app.auth import SESSION_COOKIE, verify_session_token
+from app.database import engine, engine_profile, make_engine, shard_pool
+from app.models import CatalogModel, GroupMember, SavingGroup, User
+from app.settings import (
+    DEFAULT_GROUP, GROUP_ID_PATTERN, Settings, get_settings, set_group_settings_loader, use_group,
+)
+
+CATALOG_FILE = os.getenv(
+    "CATALOG_FILE", os.path.splitext(os.getenv("SQLITE_FILE", "savings.db"))[0] + "-catalog.db"
+)
+catalog_engine = make_engine(f"sqlite:///{CATALOG_FILE}", replace(engine_profile, pool_size=5, max_overflow=10))
+
+
+class UnknownGroup(LookupError):
+    pass
+
+
+def create_catalog():
+    CatalogModel.metadata.create_all(catalog_engine)
+
+
+def register_members(usernames: list[str], group_id: str) -> int:
+    # Maps usernames that no group has yet to group_id; returns how many were new
+    if not usernames:
+        return 0
+    with catalog_engine.begin() as connection:
+        result = connection.execute(
+            insert(GroupMember).prefix_with("OR IGNORE"),
+            [{"username": username, "group_id": group_id} for username in usernames],
+        )
+    return result.rowcount
+
+
+def register_default_members() -> int:
+    # Puts every user of the default database in the catalog, so new members of
+    # other groups can't take their usernames. Cheap to rerun at every startup.
+    with Session(engine) as session:
+        usernames = session.exec(select(User.username)).all()
+    return register_members(usernames, DEFAULT_GROUP)
+
+
+def list_groups() -> list[SavingGroup]:
+    with Session(catalog_engine) as session:
+        return session.exec(select(SavingGroup).order_by(SavingGroup.id)).all()
+
+
+def get_group(group_id: str) -> Optional[SavingGroup]:
+    with Session(catalog_engine) as session:
+        return session.get(SavingGroup, group_id)
+
+
+def create_group(
+    group_id: str,
+    name: str,
+    start_date: date,
+    end_date: date,
+    deadline: date,
+    target_saving_amount: float,
+    weekly_target_amount: float,
+    admin_username: str,
+) -> SavingGroup:
+    """Adds a group to the catalog and creates its shard. Raises ValueError for a bad or taken id."""
+    if group_id == DEFAULT_GROUP or not GROUP_ID_PATTERN.fullmatch(group_id):
+        raise ValueError(f"Invalid group id {group_id!r}: use lowercase letters, digits and dashes")
+    if get_group(group_id) is not None:
+        raise ValueError(f"Group {group_id!r} already exists")
+    group = SavingGroup(
+        id=group_id, name=name, start_date=start_date, end_date=end_date, deadline=deadline,
+        target_saving_amount=target_saving_amount, weekly_target_amount=weekly_target_amount,
+        admin_username=admin_username,
+    )
+    with Session(catalog_engine, expire_on_commit=False) as session:
+        session.add(group)
+        session.commit()
+    shard_pool.get(group_id)
+    return group
+
+
+def group_exists(group_id: str) -> bool:
+    if group_id == DEFAULT_GROUP:
+        return True
+    try:
+        group_settings(group_id)
+    except UnknownGroup:
+        return False
+    return True
+
+
+def group_of(username: str) -> str:
+    # Usernames missing from the catalog predate it and belong to the default group
+    with Session(catalog_engine) as session:
+        group_id = session.exec(select(GroupMember.group_id).where(GroupMember.username == username)).first()
+    return group_id or DEFAULT_GROUP
+
+
+def claim_username(username: str, group_id: str) -> bool:
+    # Reserves the username for group_id; False if any group already has it
+    return register_members([username], group_id) == 1
+
+
+def members_elsewhere(usernames: list[str], group_id: str) -> list[str]:
+    # Those of usernames the catalog maps to another group
+    with Session(catalog_engine) as session:
+        return session.exec(select(GroupMember.username).where(
+            GroupMember.username.in_(usernames), GroupMember.group_id != group_id
+        )).all()
+
+
+def release_username(username: str):
+    # Undoes claim_username when creating the user itself failed
+    with catalog_engine.begin() as connection:
+        connection.execute(GroupMember.__table__.delete().where(GroupMember.username == username))
+
+
+_group_settings: dict[str, Settings] = {}
+_group_settings_lock = threading.Lock()
+
+
+def group_settings(group_id: str) -> Settings:
+    # Groups don't change once created, so each one's Settings is read from the
+    # catalog once per process. The admin panel belongs to the group's own
+    # admin; the contact details shown to members come from the environment.
+    settings = _group_settings.get(group_id)
+    if settings is not None:
+        return settings
+    group = get_group(group_id)
+    if group is None:
+        raise UnknownGroup(group_id)
+    with use_group(DEFAULT_GROUP):
+        base = get_settings()
+    settings = replace(
+        base,
+        start_date=group.start_date,
+        end_date=group.end_date,
+        deadline=group.deadline,
+        target_saving_amount=group.target_saving_amount,
+        weekly_target_amount=group.weekly_target_amount,
+        admin_panel_name=group.admin_username,
+    )
+    with _group_settings_lock:
+        return _group_settings.setdefault(group_id, settings)
+
+
+set_group_settings_loader(group_settings)
+
+
+def request_group(scope) -> str:
+    claims = verify_session_token(Request(scope).cookies.get(SESSION_COOKIE))
+    return claims.group if claims is not None else DEFAULT_GROUP
+
+
+class GroupMiddleware:
+    """Runs each request inside ``use_group`` for the group in its session cookie."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        group_id = request_group(scope)
+        if group_id == DEFAULT_GROUP:
+            await self.app(scope, receive, send)
+            return
+        if not group_exists(group_id):
+            await PlainTextResponse("Unknown saving group", status_code=404)(scope, receive, send)
+            return
+        with use_group(group_id):
+            await self.app(scope, receive, send)
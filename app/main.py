@@ -1,46 +1,69 @@
-from collections import defaultdict
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from app.startup import boot, FAST_START, bytecode_cache, warm_up, log_report
+from fastapi import FastAPI, Request, Form, UploadFile, File, Depends
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
-from app.database import get_session, engine
-from app.models import User, AuthorizedUser, Deposit
-from sqlmodel import Session, select
-from app.database import create_db_and_tables
-from app.crud import deauthorize_user, get_user_by_username, create_user, is_authorized, get_all_users, authorize_user, save_deposit, get_paid_week_dates
+from app.database import get_db, get_async_db, AsyncDbSession
+from app import async_crud
+from app.cache import leaderboard_cache, get_data_version, make_etag, etag_matches, cached_computation, Overloaded
+from sqlmodel import Session
+from app.database import create_db_and_tables, async_session_scope, session_scope
+from app.crud import deauthorize_user, get_user_by_username, create_user, authorize_user
+from app.crud import ensure_member_stats
+from app.crud import import_deposits, iter_deposit_pages, search_users, set_authorization
 
 from app.crud import update_user_password
 from typing import Optional , List 
-from app.utils import get_all_saving_weeks, read_env_file, compute_streaks
+from app.utils import get_saving_calendar, parse_deposit_rows, encode_deposits_csv, encode_deposits_jsonl
+from app.settings import get_settings, use_group, DEFAULT_GROUP
+from app.auth import (
+    EPHEMERAL_SECRET, SESSION_COOKIE, SESSION_MAX_AGE, SessionClaims, issue_session_token, verify_session_token,
+    cached_authorization, remember_authorization, get_auth_revision,
+)
+from app.streaks import build_week_matrix
+from app.assets import AssetFiles, DynamicCompression, static_url, image_sources
+from app.reminders import REMINDERS_ENABLED, acquire_scheduler_lock, reminder_scheduler, stop_scheduler
+from app.events import leaderboard_events, DepositDelta
+from app.group_commit import GROUP_COMMIT, deposit_writer
+from app.groups import GroupMiddleware, create_catalog, register_default_members, group_of, group_exists
+from app.groups import claim_username, release_username
+from app.metrics import MetricsMiddleware, ProfilingMiddleware, TimedTemplate, render_metrics
 from datetime import datetime, date 
 
+import hmac
 import os
-from dotenv import load_dotenv
+from urllib.parse import urlencode
+import json
+import logging
+import asyncio
 
-# Try loading from .env in project root (for local dev)
-load_dotenv()
+try:
+    # Optional: brotli-asgi serves br to browsers that accept it and gzip to the rest
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
 
-# If running on Render, this will override with real secrets
-load_dotenv("/etc/secrets/.env", override=True)
+boot.mark("imports")
 
-ADMIN_NAME = os.getenv('ADMIN_NAME')
-ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
-ADMIN_GITHUB = os.getenv("ADMIN_GITHUB")
-TARGET_SAVING_AMOUNT = read_env_file('global.env').get('TARGET_SAVING_AMOUNT', 4000)
-START_DATE = datetime.strptime(read_env_file('global.env').get('START_DATE', '2025-04-07'), '%Y-%m-%d').date()
-END_DATE = datetime.strptime(read_env_file('global.env').get('END_DATE', '2026-12-31'), '%Y-%m-%d').date()
-DEADLINE = datetime.strptime(read_env_file('global.env').get('EXPECTED_DEADLINE_FOR_TRAVEL', '2025-10-18'), '%Y-%m-%d').date()
 # Determine if running on Render
 IS_RENDER = os.getenv("RENDER") == "true"
 
+logger = logging.getLogger("uvicorn.error")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Lifespan context for FastAPI application.
 
     This function runs once when the application starts and performs any required
-    startup tasks such as initializing the database and creating tables.
+    startup tasks such as initializing the database, creating tables and the
+    saving-group catalog, and backfilling the member aggregates table if it is
+    empty. With FAST_START it
+    also warms connections, caches and templates, then logs a startup report.
+    With REMINDERS_ENABLED one worker runs the weekly reminder scheduler, and
+    with GROUP_COMMIT every worker runs a deposit writer.
 
     Args:
         app (FastAPI): The FastAPI app instance.
@@ -48,20 +71,86 @@ async def lifespan(app: FastAPI):
     Yields:
         None: Yields control back to FastAPI after performing setup.
     """
+    if EPHEMERAL_SECRET:
+        logger.warning("SESSION_SECRET is not set: sessions are signed with a random key and end on every restart")
     create_db_and_tables()
+    boot.mark("create tables")
+    create_catalog()
+    register_default_members()
+    boot.mark("group catalog")
+    ensure_member_stats()
+    boot.mark("member stats")
+    if FAST_START:
+        warm_up(templates.env)
+        await load_leaderboard_rankings()
+        boot.mark("warm: aggregates")
+    log_report()
+
+    reminder_task = None
+    if REMINDERS_ENABLED:
+        scheduler_lock = acquire_scheduler_lock()
+        if scheduler_lock is not None:
+            reminder_task = asyncio.create_task(reminder_scheduler())
+    if GROUP_COMMIT:
+        deposit_writer.start()
     yield
+    await leaderboard_events.close()
+    await deposit_writer.stop()
+    if reminder_task is not None:
+        await stop_scheduler(reminder_task)
+        scheduler_lock.close()
 
 app = FastAPI(lifespan=lifespan)
 
+# Compress HTML pages and JSON API responses; /static ships precompressed files
+app.add_middleware(
+    DynamicCompression,
+    compressor=BrotliMiddleware if BrotliMiddleware is not None else GZipMiddleware,
+    minimum_size=500,
+)
+
+def is_admin_request(scope) -> bool:
+    # Used by the profiler middleware, which runs before routing
+    claims = get_session_claims(Request(scope))
+    return claims is not None and get_settings().is_admin(claims.username)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # Shed load instead of queueing ever more expensive recomputations
+    return Response(status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+# The middleware added last runs first: metrics time everything below them
+app.add_middleware(GroupMiddleware)
+app.add_middleware(ProfilingMiddleware, is_allowed=is_admin_request)
+app.add_middleware(MetricsMiddleware, router_app=app)
+
 # Mount static folder to serve images, CSS, etc.
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount("/static", AssetFiles(directory="app/static"), name="static")
 
 
 # Point to the templates folder
 templates = Jinja2Templates(directory="app/templates")
+templates.env.template_class = TimedTemplate
+templates.env.bytecode_cache = bytecode_cache()
+templates.env.globals["static_url"] = static_url
+templates.env.globals["image_sources"] = image_sources
+
+def get_session_claims(request: Request) -> Optional[SessionClaims]:
+    return verify_session_token(request.cookies.get(SESSION_COOKIE))
 
 def get_logged_in_user(request: Request) -> Optional[str]:
-    return request.cookies.get("username")
+    claims = get_session_claims(request)
+    return claims.username if claims else None
+
+async def is_session_authorized(claims: SessionClaims, session: AsyncDbSession) -> bool:
+    # Answered from the signed token or the in-process cache; the database is
+    # only asked after an authorization change the cache hasn't seen yet.
+    authorized = cached_authorization(claims)
+    if authorized is None:
+        revision = get_auth_revision()
+        authorized = await async_crud.is_authorized(claims.username, session=session)
+        remember_authorization(claims.username, authorized, revision)
+    return authorized
 
 @app.get("/", response_class=HTMLResponse)
 def login_page(request: Request):
@@ -85,31 +174,71 @@ def login_page(request: Request):
     response.delete_cookie("message")
     return response
 
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 200
+ADMIN_STATUS_FILTERS = {"authorized": True, "unauthorized": False}
+
 @app.get("/admin-access", response_class=HTMLResponse)
-def admin_panel(request: Request):
+def admin_panel(
+    request: Request,
+    q: str = "",
+    match: str = "prefix",
+    status: str = "",
+    after: Optional[str] = None,
+    limit: int = ADMIN_PAGE_SIZE,
+    session: Session = Depends(get_db),
+):
     """
     Displays the admin panel if the current user is the configured admin.
 
-    Checks whether the logged-in user matches the admin credentials from the environment.
-    If valid, returns a list of users and authorized users.
+    Lists users a page at a time in username order, with their authorization
+    status. Pages are keyset-paginated on username, so later pages cost the same
+    as the first one.
 
     Args:
         request (Request): The incoming HTTP request.
+        q (str, optional): Username prefix, or substring when match is "contains".
+        match (str, optional): "prefix" (default) or "contains".
+        status (str, optional): "authorized" or "unauthorized" to filter on status.
+        after (str, optional): Last username of the previous page.
+        limit (int, optional): Users per page, at most 200.
+        session (Session): Request-scoped database session.
 
     Returns:
         HTMLResponse: Admin panel page or 403 Access Denied if unauthorized.
     """
     current_user = get_logged_in_user(request)
-    if current_user is None or current_user.lower() != os.getenv("ADMIN_PANEL_NAME", "").lower():
+    if not get_settings().is_admin(current_user):
         return HTMLResponse("Access denied", status_code=403)
 
-    users = get_all_users()
-    authorized = [user.username for user in get_session().exec(select(AuthorizedUser)).all()]
-    return templates.TemplateResponse("admin_panel.html", {
+    q = q.strip()
+    limit = min(max(limit, 1), ADMIN_MAX_PAGE_SIZE)
+    page = search_users(
+        q, contains=match == "contains", status=ADMIN_STATUS_FILTERS.get(status),
+        after=after or None, limit=limit, session=session,
+    )
+    filters = {"q": q, "match": match, "status": status, "limit": limit}
+    next_url = None
+    if page.next_after is not None:
+        next_url = "/admin-access?" + urlencode({**filters, "after": page.next_after})
+    response = templates.TemplateResponse("admin_panel.html", {
         "request": request,
-        "users": users,
-        "authorized": authorized
+        "users": page.rows,
+        "filters": filters,
+        "first_url": "/admin-access?" + urlencode(filters),
+        "next_url": next_url,
+        "is_first_page": not after,
+        "return_to": request.url.path + ("?" + request.url.query if request.url.query else ""),
+        "message": request.cookies.get("message"),
     })
+    response.delete_cookie("message")
+    return response
+
+def admin_redirect(return_to: str) -> RedirectResponse:
+    # Back to the panel page the form was posted from; never off-site
+    if not return_to.startswith("/admin-access"):
+        return_to = "/admin-access"
+    return RedirectResponse(return_to, status_code=302)
 
 
 # Adding the register page route
@@ -152,7 +281,7 @@ def reset_password_page(request: Request, username: str = ""):
     })
 
 @app.post("/login", response_class=HTMLResponse)
-def login_user(
+async def login_user(
     request: Request,
     username: str = Form(...),
     password: str = Form(...)
@@ -160,9 +289,11 @@ def login_user(
     """
     Handles user login authentication.
 
-    Validates the submitted username and password. If the credentials are correct,
-    a secure cookie is set for the session. If the user is not authorized, they're
-    redirected to the unauthorized access page.
+    Looks up the member's saving group in the catalog, then validates the
+    submitted username and password against that group's database with a
+    single query. If the credentials are correct, a signed session cookie
+    carrying the user id, group and authorization status is set. If the user is
+    not authorized, they're redirected to the unauthorized access page.
 
     Args:
         request (Request): The incoming HTTP request.
@@ -173,7 +304,12 @@ def login_user(
         HTMLResponse or RedirectResponse: Redirects to the dashboard or unauthorized page, 
         or shows login form again on error.
     """
-    user = get_user_by_username(username)
+    with use_group(await run_in_threadpool(group_of, username)):
+        return await login_in_group(request, username, password)
+
+async def login_in_group(request: Request, username: str, password: str):
+    async with async_session_scope() as session:
+        user = await async_crud.get_user_with_authorization(username, session=session)
     if not user:
         return RedirectResponse(url=f"/register?username={username}", status_code=302)
 
@@ -186,26 +322,15 @@ def login_user(
             )
         })
 
-    #Set cookie regardless of authorization
-    response = RedirectResponse(url="/dashboard", status_code=302)
+    #Not authorized: redirect to the unauthorized page, but still sign them in
+    response = RedirectResponse(url="/dashboard" if user.authorized else "/unauthorized", status_code=302)
     response.set_cookie(
-        "username", username,
+        SESSION_COOKIE, issue_session_token(user.id, user.username, user.authorized),
+        max_age=SESSION_MAX_AGE,
         httponly=True,
         secure=IS_RENDER,
         samesite="Lax"
     )
-
-    #Not authorized: redirect to dashboard with message
-    if not is_authorized(username):
-        response = RedirectResponse(url="/unauthorized", status_code=302)
-        response.set_cookie(
-            "username", username,
-            httponly=True,
-            secure=IS_RENDER,
-            samesite="Lax"
-        )
-        return response
-
     return response
 
 @app.get("/unauthorized", response_class=HTMLResponse)
@@ -222,12 +347,13 @@ def unauthorized_page(request: Request):
         HTMLResponse: The unauthorized access template.
     """
     current_user = get_logged_in_user(request)
+    settings = get_settings()
     return templates.TemplateResponse("unauthorized.html", {
         "request": request,
         "current_user": current_user,
-        "admin_name": ADMIN_NAME,
-        "admin_github": ADMIN_GITHUB,
-        "admin_email": ADMIN_EMAIL,
+        "admin_name": settings.admin_name,
+        "admin_github": settings.admin_github,
+        "admin_email": settings.admin_email,
     })
 
 
@@ -235,31 +361,50 @@ def unauthorized_page(request: Request):
 def register_user(
     request: Request,
     username: str = Form(...),
-    password: str = Form(...)
+    password: str = Form(...),
+    group: str = Form(""),
 ):
     """
     Registers a new user account.
 
-    Checks if the username is already taken. If not, creates the user and redirects
-    to the login page with a success message.
+    Checks if the username is already taken in any saving group. If not, reserves
+    it in the catalog, creates the user in the chosen group's database and
+    redirects to the login page with a success message.
 
     Args:
         request (Request): The incoming HTTP request.
         username (str): The username submitted via the form.
         password (str): The password submitted via the form.
+        group (str, optional): Code of the saving group to join; empty for the default group.
 
     Returns:
         HTMLResponse or RedirectResponse: Registration form with validation or login page.
     """
-    existing = get_user_by_username(username)
-    if existing:
+    group_id = group.strip().lower() or DEFAULT_GROUP
+    if not group_exists(group_id):
         return templates.TemplateResponse("register.html", {
             "request": request,
-            "message": "User already exists. Please log in instead.",
-            "username": username
+            "message": "There is no saving group with that code.",
+            "username": username,
+            "group": group,
         })
 
-    create_user(username, password)
+    with use_group(group_id), session_scope() as session:
+        claimed = claim_username(username, group_id)
+        if not claimed or get_user_by_username(username, session=session):
+            if claimed:
+                release_username(username)  # the user predates the catalog; don't leave our claim behind
+            return templates.TemplateResponse("register.html", {
+                "request": request,
+                "message": "User already exists. Please log in instead.",
+                "username": username,
+                "group": group,
+            })
+        try:
+            create_user(username, password, session=session)
+        except Exception:
+            release_username(username)
+            raise
 
     # Redirect to login page with success message
     response = RedirectResponse(url="/", status_code=302)
@@ -301,14 +446,14 @@ def reset_password(
             "message": "Passwords do not match. Try again!"
         })
 
-    user = get_user_by_username(username)
-    if not user:
-        return templates.TemplateResponse("reset_password.html", {
-            "request": request,
-            "message": "User not found. Try again."
-        })
-
-    update_user_password(username, new_password)
+    with use_group(group_of(username)), session_scope() as session:
+        user = get_user_by_username(username, session=session)
+        if not user:
+            return templates.TemplateResponse("reset_password.html", {
+                "request": request,
+                "message": "User not found. Try again."
+            })
+        update_user_password(username, new_password, session=session)
     response = RedirectResponse(url="/", status_code=302)
     response.set_cookie("message", "Password reset! You can now log in.",
                          httponly=True,
@@ -318,44 +463,47 @@ def reset_password(
     return response
 
 @app.get("/dashboard", response_class=HTMLResponse)
-def dashboard(request: Request):
+async def dashboard(request: Request, session: AsyncDbSession = Depends(get_async_db)):
     """
     Displays the main dashboard for logged-in users.
 
     Shows total savings, progress towards the goal, weekly recommendations, 
-    and recent deposit activity. Redirects to login if the user is not authenticated.
+    and recent deposit activity. Redirects to login if the user is not authenticated,
+    and to the unauthorized page if they are no longer authorized.
 
     Args:
         request (Request): The incoming HTTP request.
+        session (AsyncDbSession): Request-scoped database session.
 
     Returns:
         HTMLResponse or RedirectResponse: Renders the dashboard template or 
         redirects to login page if unauthenticated.
     """
 
-    username = request.cookies.get("username")
-    if not username:
+    claims = get_session_claims(request)
+    if not claims:
         return RedirectResponse(url="/", status_code=302)
+    if not await is_session_authorized(claims, session):
+        return RedirectResponse(url="/unauthorized", status_code=302)
+    username = claims.username
 
     # Load message from cookie
     message = request.cookies.get("message")
     
     # Weeks logic
-    all_weeks = get_all_saving_weeks()
-    paid_weeks = get_paid_week_dates(username)
-    unpaid_weeks = [w for w in all_weeks if w not in paid_weeks and w < date.today()]
+    calendar = get_saving_calendar()
+    paid_weeks = await async_crud.get_paid_week_dates(username, session=session)
+    unpaid_weeks = calendar.unpaid_weeks(calendar.bitmap(paid_weeks), date.today())
     next_unpaid = unpaid_weeks[0] if unpaid_weeks else None
 
     # Total saved
-    with get_session() as session:
-        statement = select(Deposit).where(Deposit.username == username)
-        deposits = session.exec(statement).all()
-
-    total_saved = sum(d.amount for d in deposits)
-    recent_deposits = sorted(deposits, key=lambda d: d.timestamp, reverse=True)[:5]
+    total_saved = await async_crud.get_total_saved(username, session=session)
+    recent_deposits = await async_crud.get_recent_deposits(username, limit=5, session=session)
 
     # Progress logic
-    progress_percent = round(min(total_saved / TARGET_SAVING_AMOUNT * 100, 100))
+    settings = get_settings()
+    target = settings.target_saving_amount
+    progress_percent = round(min(total_saved / target * 100, 100))
     if progress_percent >= 90:
         progress_color = "green"
     elif progress_percent >= 75:
@@ -367,14 +515,15 @@ def dashboard(request: Request):
 
     # Weekly needed logic
     today = date.today()
-    deadline = DEADLINE
+    deadline = settings.deadline
     weeks_remaining = max((deadline - today).days // 7, 1)
-    weekly_needed = round((TARGET_SAVING_AMOUNT - total_saved) / weeks_remaining, 2) if total_saved < 4000 else 0
+    weekly_needed = round((target - total_saved) / weeks_remaining, 2) if total_saved < target else 0
 
     response = templates.TemplateResponse("dashboard.html", {
         "request": request,
         "logged_in_user": username,
         "total_saved": total_saved,
+        "goal": target,
         "progress_percent": progress_percent,
         "progress_color": progress_color,
         "weeks_remaining": weeks_remaining,
@@ -382,7 +531,7 @@ def dashboard(request: Request):
         "recent_deposits": recent_deposits,
         "next_unpaid": next_unpaid,
         "unpaid_weeks": [w.strftime("%B %d, %Y") for w in unpaid_weeks],
-        "saving_weeks": all_weeks,
+        "saving_weeks": calendar.weeks,
         "message": message,
     })
 
@@ -390,9 +539,9 @@ def dashboard(request: Request):
     return response
 
 @app.post("/deposit", response_class=HTMLResponse)
-def submit_deposit(
+async def submit_deposit(
     request: Request,
-    username: str = Form(...),
+    session: AsyncDbSession = Depends(get_async_db),
     amount: float = Form(...),
     selected_weeks: List[str] = Form([])  # Dates as strings like '2025-04-07'
 ):
@@ -400,56 +549,67 @@ def submit_deposit(
     Handles deposit submission and allocation logic.
 
     Distributes deposit amounts across selected weeks, or auto-assigns to 
-    first unpaid week. Stores deposits and sets summary message in cookies.
+    first unpaid week. The deposit always goes to the member the session
+    cookie belongs to. Stores all allocations in one transaction (batched with
+    other requests when GROUP_COMMIT is on) and sets summary message in cookies.
 
     Args:
         request (Request): The incoming HTTP request.
-        username (str): The username making the deposit.
         amount (float): The total deposit amount.
         selected_weeks (List[str]): List of ISO week dates to allocate deposit.
+        session (AsyncDbSession): Request-scoped database session.
 
     Returns:
-        RedirectResponse: Redirects to the leaderboard with deposit summary message.
+        RedirectResponse: Redirects to the leaderboard with deposit summary message,
+        or to the login/unauthorized page if the session may not deposit.
     """
-
-    all_weeks = get_all_saving_weeks()
-    paid_weeks = get_paid_week_dates(username)
-    today = datetime.now().date()
-    unpaid_weeks = [w for w in all_weeks if w not in paid_weeks and w < today]
-
-    deposit_summary = ""
-    unpaid_status = ""
-
-    # Build unpaid weeks status
-    if unpaid_weeks:
-        unpaid_status = f"You currently have {len(unpaid_weeks)} unpaid week(s): " + \
-                        ", ".join([w.strftime('%b %d') for w in unpaid_weeks])
-    else:
-        unpaid_status = "You're fully up-to-date! No unpaid weeks."
-
-    deposits = []
+    claims = get_session_claims(request)
+    if not claims:
+        return RedirectResponse(url="/", status_code=302)
+    if not await is_session_authorized(claims, session):
+        return RedirectResponse(url="/unauthorized", status_code=302)
+    username = claims.username
 
     if selected_weeks:
         # Parse the selected week dates
         parsed_weeks = [datetime.strptime(w, "%Y-%m-%d").date() for w in selected_weeks]
         parsed_weeks.sort()
         per_week = round(amount / len(parsed_weeks), 2)
+        allocations = [(week_date, per_week) for week_date in parsed_weeks]
+    else:
+        # No weeks selected → auto-assign to first unpaid week
+        allocations = [(None, amount)]
 
-        for week_date in parsed_weeks:
-            save_deposit(username, per_week, week_date=week_date)
-            deposits.append((week_date, per_week))
+    # One transaction for every allocation (or a share of a group commit); it
+    # also reports the weeks still unpaid
+    if GROUP_COMMIT:
+        result = await deposit_writer.submit(username, allocations, datetime.now().date())
+    else:
+        result = await async_crud.save_deposits_bulk(username, allocations, today=datetime.now().date(), session=session)
+    deposits = result.allocations
+    unpaid_weeks = result.unpaid_weeks
+    if result.stats is not None:
+        total, streak, max_streak = result.stats
+        leaderboard_events.publish_deposit(DepositDelta(
+            username, round(sum(amount for _, amount in deposits), 2), round(total, 2), streak, max_streak,
+            get_data_version(),
+        ))
 
-        deposit_summary = f"You paid {amount:.2f} EGP for {len(parsed_weeks)} week(s): " + \
+    if selected_weeks:
+        deposit_summary = f"You paid {amount:.2f} EGP for {len(deposits)} week(s): " + \
                           ", ".join([f"{d[0].strftime('%b %d')} ({d[1]} EGP)" for d in deposits])
+    elif not deposits:
+        deposit_summary = "You didn't pick a week, and you've already paid for all weeks."
+    else:
+        auto_week = deposits[0][0]
+        deposit_summary = f"You didn't pick a week, so we assigned your deposit to {auto_week.strftime('%B %d')}."
 
+    # Build unpaid weeks status
+    if unpaid_weeks:
+        unpaid_status = f"You currently have {len(unpaid_weeks)} unpaid week(s): " + \
+                        ", ".join([w.strftime('%b %d') for w in unpaid_weeks])
     else:
-        # No weeks selected → auto-assign to first unpaid week
-        if not unpaid_weeks:
-            deposit_summary = "You didn't pick a week, and you've already paid for all weeks."
-        else:
-            auto_week = unpaid_weeks[0]
-            save_deposit(username, amount, week_date=auto_week)
-            deposit_summary = f"You didn't pick a week, so we assigned your deposit to {auto_week.strftime('%B %d')}."
+        unpaid_status = "You're fully up-to-date! No unpaid weeks."
 
     # Combine both into final message
     full_message = f"{deposit_summary}<br><br>{unpaid_status}"
@@ -463,7 +623,7 @@ def submit_deposit(
     return response
 
 @app.post("/authorize/{username}", response_class=HTMLResponse)
-def do_authorize_user(username: str, request: Request):
+def do_authorize_user(username: str, request: Request, return_to: str = Form("/admin-access"), session: Session = Depends(get_db)):
     """
     Authorizes a user via the admin panel.
 
@@ -473,21 +633,22 @@ def do_authorize_user(username: str, request: Request):
     Args:
         username (str): Username to authorize.
         request (Request): The incoming HTTP request.
+        return_to (str, optional): Admin panel page to go back to.
+        session (Session): Request-scoped database session.
 
     Returns:
         RedirectResponse or HTMLResponse: Redirects to admin panel or denies access.
     """
 
-    # Again, hardcoded for now
     current_user = get_logged_in_user(request)
-    if current_user.lower() != os.getenv("ADMIN_PANEL_NAME", "").lower():
+    if not get_settings().is_admin(current_user):
         return HTMLResponse("Access denied", status_code=403)
 
-    authorize_user(username)
-    return RedirectResponse("/admin-access", status_code=302)
+    authorize_user(username, session=session)
+    return admin_redirect(return_to)
 
 @app.post("/deauthorize/{username}", response_class=HTMLResponse)
-def do_deauthorize_user(username: str, request: Request):
+def do_deauthorize_user(username: str, request: Request, return_to: str = Form("/admin-access"), session: Session = Depends(get_db)):
     """
     Removes authorization from a user via the admin panel.
 
@@ -497,89 +658,338 @@ def do_deauthorize_user(username: str, request: Request):
     Args:
         username (str): Username to deauthorize.
         request (Request): The incoming HTTP request.
+        return_to (str, optional): Admin panel page to go back to.
+        session (Session): Request-scoped database session.
 
     Returns:
         RedirectResponse or HTMLResponse: Redirects to admin panel or denies access.
     """
 
     current_user = get_logged_in_user(request)
-    if current_user is None or current_user.lower() != os.getenv("ADMIN_PANEL_NAME", "").lower():
+    if not get_settings().is_admin(current_user):
+        return HTMLResponse("Access denied", status_code=403)
+
+    deauthorize_user(username, session=session)
+    return admin_redirect(return_to)
+
+@app.post("/admin/authorization", response_class=HTMLResponse)
+def set_users_authorization(
+    request: Request,
+    action: str = Form(...),
+    usernames: List[str] = Form([]),
+    return_to: str = Form("/admin-access"),
+    session: Session = Depends(get_db),
+):
+    """
+    Authorizes or deauthorizes the selected users in one transaction.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        action (str): "authorize" or "deauthorize".
+        usernames (List[str]): Usernames ticked in the admin panel.
+        return_to (str, optional): Admin panel page to go back to.
+        session (Session): Request-scoped database session.
+
+    Returns:
+        RedirectResponse or HTMLResponse: Redirects to admin panel with a summary
+        message, or denies access.
+    """
+    current_user = get_logged_in_user(request)
+    if not get_settings().is_admin(current_user):
         return HTMLResponse("Access denied", status_code=403)
+    if action not in ("authorize", "deauthorize"):
+        return HTMLResponse("Unknown action", status_code=400)
+
+    changed = set_authorization(usernames, action == "authorize", session=session)
+    response = admin_redirect(return_to)
+    response.set_cookie("message", f"{action.capitalize()}d {changed} of {len(set(usernames))} selected user(s).",
+                        httponly=True,
+                        secure=IS_RENDER,
+                        samesite="Lax"
+                        )
+    return response
 
-    deauthorize_user(username)
-    return RedirectResponse("/admin-access", status_code=302)
+@app.post("/admin/import-deposits", response_class=HTMLResponse)
+async def import_deposits_file(request: Request, file: UploadFile = File(...), session: Session = Depends(get_db)):
+    """
+    Bulk-imports historical deposits from an uploaded JSON or CSV file.
+
+    JSON files hold an array of objects; CSV files need a header row. Each record
+    has username and amount, and optionally week_date and timestamp (ISO format).
+    Rows are inserted in batched transactions and the member aggregates are
+    rebuilt afterwards.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        file (UploadFile): The uploaded deposits file.
+        session (Session): Request-scoped database session.
+
+    Returns:
+        RedirectResponse or HTMLResponse: Redirects to admin panel with a summary
+        message, or denies access.
+    """
+    current_user = get_logged_in_user(request)
+    if not get_settings().is_admin(current_user):
+        return HTMLResponse("Access denied", status_code=403)
+
+    content = await file.read()
+    try:
+        rows = parse_deposit_rows(file.filename or "", content)
+        message = f"Imported {await run_in_threadpool(import_deposits, rows, session=session)} deposit(s) from {file.filename}."
+    except ValueError as e:
+        message = f"Import failed, nothing was saved. {e}"
+
+    response = RedirectResponse("/admin-access", status_code=302)
+    response.set_cookie("message", message,
+                        httponly=True,
+                        secure=IS_RENDER,
+                        samesite="Lax"
+                        )
+    return response
+
+EXPORT_FORMATS = {
+    "csv": (encode_deposits_csv, "text/csv; charset=utf-8"),
+    "jsonl": (encode_deposits_jsonl, "application/x-ndjson"),
+}
+
+@app.get("/export/deposits.{export_format}")
+async def export_deposits(
+    request: Request,
+    export_format: str,
+    session: AsyncDbSession = Depends(get_async_db),
+    member: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+):
+    """
+    Streams the deposit ledger as CSV or JSON Lines.
+
+    Pages through the deposit ledger (archived rows included) by id and encodes
+    each page as it is read, so memory stays flat however large the ledger is
+    and the first bytes go out immediately.
+
+    Args:
+        request (Request): The incoming HTTP request.
+        export_format (str): Either "csv" or "jsonl".
+        session (AsyncDbSession): Request-scoped database session (authorization only).
+        member (str, optional): Member whose deposits to export; defaults to the
+            signed-in member. Only the admin may export someone else's.
+        start (date, optional): Earliest week date to include.
+        end (date, optional): Latest week date to include.
+
+    Returns:
+        StreamingResponse or RedirectResponse: The export as an attachment, a
+        redirect if the session may not export, or 403 for another member's deposits.
+    """
+    if export_format not in EXPORT_FORMATS:
+        return HTMLResponse("Unknown export format", status_code=404)
+    claims = get_session_claims(request)
+    if not claims:
+        return RedirectResponse(url="/", status_code=302)
+    if not await is_session_authorized(claims, session):
+        return RedirectResponse(url="/unauthorized", status_code=302)
+    member = member or claims.username
+    if member != claims.username and not get_settings().is_admin(claims.username):
+        return HTMLResponse("Access denied", status_code=403)
+
+    encode, media_type = EXPORT_FORMATS[export_format]
+    filename = f"{member}_deposits.{export_format}"
+    return StreamingResponse(
+        encode(iter_deposit_pages(member, start, end)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+async def compute_leaderboard_rankings() -> dict:
+    # Runs at most once per data version at a time (see cached_computation), in
+    # its own session so it doesn't depend on any one waiting request.
+    async with async_session_scope() as session:
+        # Group-wide numbers come from the per-member aggregates table
+        columns = await async_crud.get_leaderboard_columns(session=session)
+
+    # Sort by streak descending
+    by_streak = sorted(range(len(columns.usernames)), key=columns.max_streaks.__getitem__, reverse=True)
+    return {
+        "usernames": list(columns.usernames),
+        "saved_amounts": [round(total, 2) for total in columns.total_saved],
+        "streak_usernames": [columns.usernames[i] for i in by_streak],
+        "streak_scores": [columns.max_streaks[i] for i in by_streak],
+    }
+
+async def load_leaderboard_rankings() -> dict:
+    """
+    Builds the group-wide part of the leaderboard, shared by every viewer.
+
+    Cached until the next write bumps the data version; concurrent misses share
+    one computation.
+
+    Returns:
+        dict: Saved amounts and streak rankings as parallel lists.
+    """
+    return await cached_computation(leaderboard_cache, ("rankings",), compute_leaderboard_rankings)
+
+def validated_response(request: Request, etag: str, body: bytes, media_type: str) -> Response:
+    # Full response, or an empty 304 when the browser already has these bytes
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+def encode_json(payload: dict) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+@app.get("/api/leaderboard")
+async def api_leaderboard(request: Request):
+    """
+    Group rankings for the leaderboard charts as compact columnar JSON.
+
+    The body is cached until the next write and carries a strong ETag, so
+    unchanged data costs the browser a 304. Under load, concurrent misses
+    share one computation, and the route answers 503 when too many are pending.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        Response: JSON with version, goal and parallel username/amount/streak arrays.
+    """
+    settings = get_settings()
+    version = get_data_version()
+
+    async def build():
+        rankings = await load_leaderboard_rankings()
+        body = encode_json({"version": version, "goal": settings.target_saving_amount, **rankings})
+        return make_etag(body), body
+
+    cached = await cached_computation(leaderboard_cache, ("api", "leaderboard"), build)
+    return validated_response(request, *cached, media_type="application/json")
+
+@app.get("/api/leaderboard/events")
+async def leaderboard_event_stream(request: Request):
+    """
+    Server-Sent Events stream of leaderboard changes.
+
+    Sends a ``deposit`` event with the member, amount, new total and new streaks
+    after every deposit, and a ``resync`` event when the browser should refetch
+    ``/api/leaderboard`` instead. A comment line every few seconds keeps the
+    connection open. Answers 503 when too many streams are open. Only
+    authorized members may subscribe.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        StreamingResponse: A ``text/event-stream`` that stays open, or 401/403 if
+        the session may not read it.
+    """
+    claims = get_session_claims(request)
+    if not claims:
+        return Response(status_code=401)
+    # A short-lived session: the stream itself stays open far longer
+    async with async_session_scope() as session:
+        if not await is_session_authorized(claims, session):
+            return Response(status_code=403)
+    return StreamingResponse(
+        leaderboard_events.subscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/heatmap/{username}")
+async def api_heatmap(username: str, request: Request):
+    """
+    One member's per-week deposit amounts as compact columnar JSON.
+
+    ``amounts[i]`` belongs to the saving week ``start + i * step_days``. Members
+    can read their own heatmap; the admin can read anyone's.
+
+    Args:
+        username (str): Member whose heatmap is requested.
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        Response: JSON heatmap, or 401/403 if the session may not read it.
+    """
+    current_user = get_logged_in_user(request)
+    if current_user is None:
+        return Response(status_code=401)
+    if current_user != username and not get_settings().is_admin(current_user):
+        return Response(status_code=403)
+
+    version = get_data_version()
+
+    async def build():
+        async with async_session_scope() as session:
+            week_amounts = await async_crud.get_week_amounts(username, session=session)
+        calendar = get_saving_calendar()
+        matrix = build_week_matrix(
+            ((username, week_date, amount) for week_date, amount in week_amounts),
+            calendar.weeks,
+        )
+        row = matrix.rows.get(username)
+        body = encode_json({
+            "version": version,
+            "member": username,
+            "start": calendar.start_date.isoformat(),
+            "step_days": 7,
+            "amounts": matrix.heatmap(username),
+            "paid_weeks": matrix.paid_counts[row] if row is not None else 0,
+            "missed_weeks": matrix.missed_counts[row] if row is not None else calendar.weeks_before(date.today()),
+        })
+        return make_etag(body), body
+
+    cached = await cached_computation(leaderboard_cache, ("api", "heatmap", username), build)
+    return validated_response(request, *cached, media_type="application/json")
 
 @app.get('/leaderboard', response_class=HTMLResponse)
-def leaderboard(request: Request):
+async def leaderboard(request: Request):
     """
     Displays the savings leaderboard with streaks and heatmap data.
 
-    Aggregates deposits for all users, builds heatmap and streak visualizations 
-    for the logged-in user, and renders the leaderboard.
+    Renders only the page shell; the charts fetch their data from
+    /api/leaderboard and /api/heatmap/{user}. The shell is cached per viewer and
+    served with a strong ETag, so repeat visits get a 304.
 
     Args:
         request (Request): The incoming HTTP request.
 
     Returns:
-        HTMLResponse: The rendered leaderboard page.
-    """
-
-    with Session(engine) as session:
-        # Fetch all deposit data
-        deposits = session.exec(select(Deposit)).all()
-
-        user_totals = defaultdict(float)
-        user_deposits = defaultdict(list)
-        
-        for dep in deposits:
-            user_totals[dep.username] += dep.amount
-            if dep.week_date:
-                user_deposits[dep.username].append({
-                    "date": dep.week_date.isoformat(),
-                    "amount": dep.amount
-                })
-        print(user_deposits)
-        # Sort by most saved
-        sorted_users = sorted(user_totals.items(), key=lambda x: x[1], reverse=True)
-        usernames = [u for u, _ in sorted_users]
-        saved_amounts = [round(s, 2) for _, s in sorted_users]
-
-        # Add current user’s data
-        current_user = get_logged_in_user(request)
-        # Build full heatmap for user
-        all_weeks = get_all_saving_weeks()
-        deposits_by_week = defaultdict(float)
-        for d in user_deposits.get(current_user, []):
-            deposits_by_week[d["date"]] += d["amount"]
-
-        heatmap_data = []
-        for week in all_weeks:
-            iso = week.isoformat()
-            heatmap_data.append({
-                "date": iso,
-                "amount": round(deposits_by_week.get(iso, 0), 2)
-            })
-        user_streaks = {
-            username: compute_streaks(deps, saving_weeks=all_weeks)
-            for username, deps in user_deposits.items()
-        }
-        # Sort by streak descending
-        sorted_streaks = sorted(user_streaks.items(), key=lambda x: x[1], reverse=True)
-        streak_usernames = [u for u, _ in sorted_streaks]
-        streak_scores = [s for _, s in sorted_streaks]
-
-    print(streak_scores, streak_usernames)
-    return templates.TemplateResponse("leaderboard.html", {
-        "request": request,
-        "usernames": usernames,
-        "saved_amounts": saved_amounts,
-        "goal": TARGET_SAVING_AMOUNT,
-        "current_user": current_user,
-        "user_deposits": user_deposits.get(current_user, []),  # Only show chart for logged-in user
-        "heatmap_data": heatmap_data,
-        'start_date': START_DATE.strftime('%Y-%m-%d'),
-        'end_date': END_DATE.strftime('%Y-%m-%d'),
-        "streak_usernames": streak_usernames,
-        "streak_scores": streak_scores,
-    })
+        HTMLResponse: The rendered leaderboard page, or an empty 304 response.
+    """
+    current_user = get_logged_in_user(request)
+    settings = get_settings()  # may hot-reload global.env, which bumps the data version
+    version = get_data_version()
+    page = leaderboard_cache.get(("page", current_user))
+
+    if page is None:
+        body = templates.TemplateResponse("leaderboard.html", {
+            "request": request,
+            "current_user": current_user,
+            'start_date': settings.start_date.strftime('%Y-%m-%d'),
+            'end_date': settings.end_date.strftime('%Y-%m-%d'),
+        }).body
+        page = (make_etag(body), body)
+        leaderboard_cache.set(("page", current_user), page, version=version)
 
+    return validated_response(request, *page, media_type="text/html; charset=utf-8")
+
+@app.get("/metrics")
+def metrics(request: Request):
+    """
+    Request, SQL and template timings in Prometheus text format.
+
+    Served to scrapers sending ``Authorization: Bearer <METRICS_TOKEN>`` and to
+    the admin's session; everyone else gets 401.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        Response: The metrics of this worker process, or 401 if the caller may not read them.
+    """
+    token = os.getenv("METRICS_TOKEN")
+    supplied = request.headers.get("authorization", "")
+    has_token = bool(token) and hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+    if not has_token and not is_admin_request(request.scope):
+        return Response(status_code=401)
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,231 @@
+"""
+Maintenance commands for the savings app.
+
+Usage:
+    python -m app.manage [--group GROUP] <command> ...
+    python -m app.manage create-group climbers --name "Climbers" --admin maya --target 6000 --weekly 200 \
+        --start 2025-09-01 --end 2026-08-31 --deadline 2026-09-15
+    python -m app.manage list-groups
+    python -m app.manage rebuild-stats
+    python -m app.manage build-assets [--skip-vendor]
+    python -m app.manage seed --members 50 --deposits 5000 [--seed 42] [--reset]
+    python -m app.manage compile-templates
+    python -m app.manage startup-report
+    python -m app.manage send-reminders [--date YYYY-MM-DD]
+    python -m app.manage compact-ledger [--keep-weeks 4] [--date YYYY-MM-DD]
+"""
+import argparse
+from datetime import datetime
+
+from app.database import create_db_and_tables
+from app.settings import DEFAULT_GROUP, use_group
+
+
+def parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def rebuild_stats(args: argparse.Namespace) -> int:
+    from app.crud import rebuild_member_stats
+
+    drifted = rebuild_member_stats()
+    if drifted:
+        print(f"Rebuilt member stats; {len(drifted)} member(s) were out of sync: {', '.join(drifted)}")
+    else:
+        print("Member stats are consistent with the deposit ledger.")
+    return 0
+
+
+def compact_ledger(args: argparse.Namespace) -> int:
+    from datetime import date, timedelta
+
+    from app.crud import compact_ledger as compact
+
+    today = parse_date(args.date) if args.date else date.today()
+    result = compact(today - timedelta(weeks=args.keep_weeks))
+    if result.backfilled:
+        print(f"Set week_date on {result.backfilled} legacy deposit(s).")
+    print(f"Compacted {result.weeks} week(s); {result.archived} deposit(s) moved to the archive.")
+    return 0
+
+
+def build_assets(args: argparse.Namespace) -> int:
+    from app.assets import build_assets as build, vendor_bundles
+
+    if not args.skip_vendor:
+        for name in vendor_bundles():
+            print(f"Fetched {name}")
+    manifest = build()
+    print(f"Built {len(manifest)} asset(s) into app/static/dist")
+    return 0
+
+
+def seed(args: argparse.Namespace) -> int:
+    from app.groups import members_elsewhere, register_members
+    from app.seed import member_name, seed_database
+
+    summary = seed_database(args.members, args.deposits, seed=args.seed, password=args.password, reset=args.reset)
+    print(f"Seeded {summary.members} member(s) and {summary.deposits} deposit(s) (seed {args.seed}).")
+    usernames = [member_name(i) for i in range(args.members)]
+    register_members(usernames, args.group)
+    taken = members_elsewhere(usernames, args.group)
+    if taken:
+        print(f"Warning: {len(taken)} of these usernames belong to another group and can't log in here.")
+    return 0
+
+
+def create_group(args: argparse.Namespace) -> int:
+    from app.groups import create_group as create
+
+    try:
+        group = create(
+            args.group_id, args.name or args.group_id, parse_date(args.start), parse_date(args.end),
+            parse_date(args.deadline), args.target, args.weekly, args.admin,
+        )
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"Created group {group.id}; members join it by registering with the code {group.id!r}.")
+    return 0
+
+
+def list_groups(args: argparse.Namespace) -> int:
+    from app.groups import list_groups as groups
+
+    for group in groups():
+        print(
+            f"{group.id:<20} {group.name:<24} {group.start_date} .. {group.end_date}  "
+            f"target {group.target_saving_amount:g} ({group.weekly_target_amount:g}/week)"
+        )
+    return 0
+
+
+def compile_templates(args: argparse.Namespace) -> int:
+    # Uses the app's own environment: the bytecode depends on its settings (autoescape etc.)
+    from app.main import templates
+    from app.startup import JINJA_CACHE_DIR, compile_templates as compile_all
+
+    if templates.env.bytecode_cache is None:
+        print(f"Cannot write the template cache to {JINJA_CACHE_DIR}")
+        return 1
+    count = compile_all(templates.env)
+    print(f"Compiled {count} template(s) into {JINJA_CACHE_DIR}")
+    return 0
+
+
+def startup_report(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from app.startup import boot
+
+    async def start_and_stop():
+        from app.main import app
+
+        async with app.router.lifespan_context(app):
+            pass
+
+    asyncio.run(start_and_stop())
+    print(boot.report())
+    return 0
+
+
+def send_reminders(args: argparse.Namespace) -> int:
+    from app.reminders import send_weekly_reminders
+
+    today = parse_date(args.date) if args.date else None
+    result = send_weekly_reminders(today)
+    if result.week_date is None:
+        print("The saving calendar hasn't started yet; nothing to send.")
+    else:
+        print(
+            f"Week of {result.week_date}: {result.members_behind} member(s) behind, "
+            f"{result.queued} reminder(s) queued, {result.sent} sent."
+        )
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    parser.add_argument("--group", default=DEFAULT_GROUP, help="Saving group to run the command for")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    new_group = subparsers.add_parser("create-group", help="Add a saving group with its own database")
+    new_group.add_argument("group_id", help="Lowercase letters, digits and dashes; members register with it")
+    new_group.add_argument("--name")
+    new_group.add_argument("--admin", required=True, help="Username of the group's admin (they register like anyone)")
+    new_group.add_argument("--start", required=True, help="First saving week (YYYY-MM-DD)")
+    new_group.add_argument("--end", required=True, help="Last day of the saving calendar (YYYY-MM-DD)")
+    new_group.add_argument("--deadline", required=True, help="Target date shown to members (YYYY-MM-DD)")
+    new_group.add_argument("--target", type=float, required=True, help="Total each member saves")
+    new_group.add_argument("--weekly", type=float, required=True, help="Amount due per week")
+    new_group.set_defaults(handler=create_group)
+
+    groups = subparsers.add_parser("list-groups", help="List the saving groups besides the default one")
+    groups.set_defaults(handler=list_groups)
+
+    rebuild = subparsers.add_parser(
+        "rebuild-stats",
+        help="Recompute the MemberStats table from the deposit ledger and report drift",
+    )
+    rebuild.set_defaults(handler=rebuild_stats)
+
+    compact = subparsers.add_parser(
+        "compact-ledger",
+        help="Roll old weeks' deposits up into weekly totals and archive the raw rows",
+    )
+    compact.add_argument("--keep-weeks", type=int, default=4, help="Recent weeks left uncompacted")
+    compact.add_argument("--date", help="Compact as if today were this day (YYYY-MM-DD)")
+    compact.set_defaults(handler=compact_ledger)
+
+    assets = subparsers.add_parser(
+        "build-assets",
+        help="Vendor front-end bundles, fingerprint and precompress static files",
+    )
+    assets.add_argument("--skip-vendor", action="store_true", help="Don't download missing vendor bundles")
+    assets.set_defaults(handler=build_assets, needs_db=False)
+
+    seeder = subparsers.add_parser(
+        "seed",
+        help="Fill the database with synthetic members and deposits",
+    )
+    seeder.add_argument("--members", type=int, default=50)
+    seeder.add_argument("--deposits", type=int, default=5000)
+    seeder.add_argument("--seed", type=int, default=42, help="Random seed; the same seed gives the same data")
+    seeder.add_argument("--password", default="password", help="Password for every generated member")
+    seeder.add_argument("--reset", action="store_true", help="Delete all users and deposits first")
+    seeder.set_defaults(handler=seed)
+
+    templates = subparsers.add_parser(
+        "compile-templates",
+        help="Precompile the Jinja templates into the bytecode cache",
+    )
+    templates.set_defaults(handler=compile_templates, needs_db=False)
+
+    report = subparsers.add_parser(
+        "startup-report",
+        help="Start the app once (with its lifespan) and print where boot time went",
+    )
+    report.set_defaults(handler=startup_report, needs_db=False)
+
+    reminders = subparsers.add_parser(
+        "send-reminders",
+        help="Queue and send this week's reminders to members who are behind",
+    )
+    reminders.add_argument("--date", help="Pretend today is this date (YYYY-MM-DD)")
+    reminders.set_defaults(handler=send_reminders)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "needs_db", True):
+        from app.groups import create_catalog, group_exists
+
+        create_db_and_tables()
+        create_catalog()
+        if not group_exists(args.group):
+            print(f"Unknown group {args.group!r}; see list-groups")
+            return 1
+    with use_group(args.group):
+        return args.handler(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
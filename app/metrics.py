@@ -0,0 +1,270 @@
+"""
+In-process metrics exposed in Prometheus text format on ``/metrics``.
+
+``MetricsMiddleware`` times every request per route template (``/api/heatmap/{username}``,
+not the raw path) and tracks in-flight requests. The SQL hooks registered in
+``app/database.py`` report each statement through ``record_query``, which
+attributes it to the request running it. ``TimedTemplate`` times Jinja renders.
+``ProfilingMiddleware`` answers ``?__profile=1`` with a profiler report instead
+of the page for callers the app allows (the admin).
+
+Numbers are per process; with several workers each one reports its own.
+"""
+import contextvars
+import io
+import threading
+import time
+from typing import Callable, Optional, Sequence
+
+from jinja2 import Template
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PROFILE_PARAM = b"__profile=1"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str):
+        self.inc(*labels, amount=-1.0)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((labels, ([*s[0]], s[1], s[2])) for labels, s in self._values.items())
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.", ("method", "route"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served.", ("method", "route"))
+QUERIES = Counter("db_queries_total", "SQL statements executed, by route.", ("route",))
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency by route.", ("route",))
+QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements per request by route.", ("route",), buckets=COUNT_BUCKETS
+)
+TEMPLATE_RENDER = Histogram("template_render_duration_seconds", "Jinja render time by template.", ("template",))
+STARTUP_PHASES = Gauge("app_startup_phase_seconds", "Time spent in each startup phase.", ("phase",))
+REGISTRY = [
+    REQUESTS, REQUEST_LATENCY, IN_FLIGHT, QUERIES, QUERY_LATENCY, QUERIES_PER_REQUEST, TEMPLATE_RENDER, STARTUP_PHASES,
+]
+
+
+class RequestStats:
+    __slots__ = ("route", "queries", "query_seconds")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("current_request", default=None)
+
+
+def record_query(duration: float):
+    # Called from the engine hooks; also runs in threadpool / greenlet workers,
+    # which inherit the request's context.
+    stats = _current_request.get()
+    route = stats.route if stats is not None else "background"
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += duration
+    QUERIES.inc(route)
+    QUERY_LATENCY.observe(duration, route)
+
+
+def render_metrics() -> bytes:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode()
+
+
+class TimedTemplate(Template):
+    """Jinja template class that records render time; set as ``env.template_class``."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            TEMPLATE_RENDER.observe(time.perf_counter() - started, self.name or "<string>")
+
+
+def route_template(app, scope) -> str:
+    # Route path template, so /api/heatmap/alice and /api/heatmap/bob share a series
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, router_app):
+        self.app = app
+        self.router_app = router_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.router_app, scope)
+        stats = RequestStats(route)
+        token = _current_request.set(stats)
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        IN_FLIGHT.inc(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec(method, route)
+            REQUEST_LATENCY.observe(time.perf_counter() - started, method, route)
+            REQUESTS.inc(method, route, status)
+            QUERIES_PER_REQUEST.observe(stats.queries, route)
+            _current_request.reset(token)
+
+
+class ProfilingMiddleware:
+    """
+    Replaces the response with a profile of the request when the query string
+    has ``__profile=1`` and ``is_allowed(scope)`` says yes.
+
+    Uses pyinstrument (HTML, follows ``await``) when installed, otherwise a
+    cProfile text report. cProfile only sees the event-loop thread, so time a
+    sync route spends in the threadpool shows up as waiting.
+    """
+
+    def __init__(self, app, is_allowed: Callable[[dict], bool]):
+        self.app = app
+        self.is_allowed = is_allowed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or PROFILE_PARAM not in scope.get("query_string", b"") or not self.is_allowed(scope):
+            await self.app(scope, receive, send)
+            return
+
+        async def discard(message):
+            pass
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+
+        if Profiler is not None:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                await self.app(scope, receive, discard)
+            finally:
+                profiler.stop()
+            body, media_type = profiler.output_html().encode(), b"text/html; charset=utf-8"
+        else:
+            import cProfile
+            import pstats
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, discard)
+            finally:
+                profiler.disable()
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(60)
+            body, media_type = report.getvalue().encode(), b"text/plain; charset=utf-8"
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", media_type), (b"cache-control", b"no-store")],
+        })
+        await send({"type": "http.response.body", "body": body})
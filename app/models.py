@@ -1,6 +1,6 @@
 from typing import Optional
 from sqlmodel import SQLModel, Field
-from sqlalchemy import Column, String
+from sqlalchemy import Column, Index, MetaData, String, UniqueConstraint
 from datetime import datetime, date  , timezone
 
 
@@ -15,10 +15,84 @@ class AuthorizedUser(SQLModel, table=True):
 
 
 class Deposit(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_deposit_username_week_date", "username", "week_date"),
+        Index("ix_deposit_username_timestamp", "username", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str
     amount: float
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     week_number: Optional[int] = None  # for backward compatibility
-    week_date: Optional[date] = None  # instead of week_number
-    
\ No newline at end of file
+    week_date: Optional[date] = None  # instead of week_number; backfilled by crud.backfill_week_dates
+
+
+class WeeklyDeposit(SQLModel, table=True):
+    # Rollup of a member's deposits in a compacted week (crud.compact_ledger).
+    # The ledger is these rows plus whatever is still in Deposit.
+    username: str = Field(primary_key=True)
+    week_date: date = Field(primary_key=True)
+    amount: float
+    count: int  # Deposit rows rolled up
+
+
+class DepositArchive(SQLModel, table=True):
+    # Raw Deposit rows of compacted weeks, ids kept, for exports and audits
+    __table_args__ = (Index("ix_depositarchive_username_timestamp", "username", "timestamp"),)
+
+    id: int = Field(primary_key=True)
+    username: str
+    amount: float
+    timestamp: datetime
+    week_date: date
+
+class MemberStats(SQLModel, table=True):
+    # Per-member aggregates kept in sync by crud.save_deposit so the read paths
+    # never have to scan the whole Deposit table.
+    id: Optional[int] = Field(default=None, primary_key=True)
+    username: str = Field(sa_column=Column("username", String, unique=True))
+    total_saved: float = 0
+    deposit_count: int = 0
+    last_week_paid: Optional[date] = None
+    current_streak: int = 0  # consecutive saving weeks ending at last_week_paid
+    max_streak: int = 0
+
+
+class ReminderOutbox(SQLModel, table=True):
+    # One row per member per reminder week; the unique key makes a rerun of the
+    # weekly job a no-op. sent_at stays empty until the sender accepted it.
+    __table_args__ = (UniqueConstraint("username", "week_date", name="uq_reminder_username_week"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    username: str
+    week_date: date  # saving week the reminder was generated in
+    missed_weeks: int
+    amount_due: float
+    message: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    sent_at: Optional[datetime] = None
+
+
+class CatalogModel(SQLModel):
+    # Tables of the group catalog database (app/groups.py), kept out of
+    # SQLModel.metadata so they aren't created in every group shard.
+    metadata = MetaData()
+
+
+class SavingGroup(CatalogModel, table=True):
+    id: str = Field(primary_key=True)  # also the shard's file name
+    name: str
+    start_date: date
+    end_date: date
+    deadline: date
+    target_saving_amount: float
+    weekly_target_amount: float
+    admin_username: str  # this group's ADMIN_PANEL_NAME
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class GroupMember(CatalogModel, table=True):
+    # Which group each username belongs to; usernames are unique across groups
+    username: str = Field(primary_key=True)
+    group_id: str = Field(index=True)
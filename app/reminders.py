@@ -0,0 +1,212 @@
+"""
+Weekly "you're N weeks behind" reminders.
+
+``send_weekly_reminders`` finds every authorized member with missed weeks in
+one query, queues one reminder per member per saving week in the
+``ReminderOutbox`` table, then hands the unsent ones to a sender in batches
+and marks them sent. Queuing ignores reminders that already exist for the
+week, so running the job twice in a week sends nothing new, and reminders a
+sender failed on are retried on the next run.
+
+Senders take a list of ``ReminderOutbox`` rows. ``FileSender`` (the default)
+appends them as JSON lines to ``REMINDER_OUTBOX_FILE``, a local stand-in for
+SMTP or WhatsApp. Set ``REMINDER_SENDER=package.module:factory`` to plug in a
+real one; the factory is called with no arguments.
+
+``reminder_scheduler`` is the in-process asyncio loop started by the app when
+``REMINDERS_ENABLED=true``. With several workers only the one holding the
+scheduler lock file runs it. It serves every saving group, each on the
+weekday its own weeks start.
+"""
+import asyncio
+import importlib
+import json
+import logging
+import os
+from contextlib import suppress
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, NamedTuple, Optional, Protocol
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.crud import get_authorized_paid_weeks, get_unsent_reminders, mark_reminders_sent, queue_reminders
+from app.database import session_scope
+from app.groups import list_groups
+from app.settings import DEFAULT_GROUP, get_settings, use_group
+from app.utils import get_saving_calendar
+
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "false").lower() in ("1", "true", "yes")
+SCHEDULER_LOCK_FILE = os.getenv("SQLITE_FILE", "savings.db") + "-reminders.lock"
+REMINDER_OUTBOX_FILE = os.getenv("REMINDER_OUTBOX_FILE", "reminders-outbox.jsonl")
+REMINDER_HOUR = int(os.getenv("REMINDER_HOUR", "9"))  # local time, on the weekday saving weeks start
+BATCH_SIZE = 500
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ReminderSender(Protocol):
+    def send_batch(self, reminders: list) -> None:
+        ...
+
+
+class FileSender:
+    def __init__(self, path: str = REMINDER_OUTBOX_FILE):
+        self.path = path
+
+    def send_batch(self, reminders: list) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for reminder in reminders:
+                f.write(json.dumps({
+                    "username": reminder.username,
+                    "week": reminder.week_date.isoformat(),
+                    "missed_weeks": reminder.missed_weeks,
+                    "amount_due": reminder.amount_due,
+                    "message": reminder.message,
+                }, ensure_ascii=False) + "\n")
+
+
+def load_sender(spec: Optional[str] = None) -> ReminderSender:
+    spec = spec or os.getenv("REMINDER_SENDER", "file")
+    if spec == "file":
+        return FileSender()
+    module_name, _, attribute = spec.partition(":")
+    factory: Callable[[], ReminderSender] = getattr(importlib.import_module(module_name), attribute)
+    return factory()
+
+
+class ReminderRun(NamedTuple):
+    week_date: Optional[date]
+    members_behind: int
+    queued: int
+    sent: int
+
+
+def reminder_message(username: str, missed: list[date], amount_due: float) -> str:
+    weeks = ", ".join(week.strftime("%b %d") for week in missed[-4:])
+    more = f" and {len(missed) - 4} earlier" if len(missed) > 4 else ""
+    return (
+        f"Hey {username}, you're {len(missed)} week(s) behind 👀 "
+        f"That's {amount_due:.0f} EGP due (weeks of {weeks}{more})."
+    )
+
+
+def build_reminders(today: date) -> tuple[Optional[date], list[dict]]:
+    """
+    Outbox rows for every authorized member with unpaid weeks before ``today``,
+    and the saving week they belong to (None before the first week starts).
+    """
+    calendar = get_saving_calendar()
+    due = calendar.weeks_before(today)
+    elapsed = calendar.weeks_before(today + timedelta(days=1))
+    if not elapsed:
+        return None, []
+    week_date = calendar.weeks[elapsed - 1]
+    weekly_target = get_settings().weekly_target_amount
+
+    paid: dict[str, int] = {}
+    for username, paid_week in get_authorized_paid_weeks(today):
+        bitmap = paid.setdefault(username, 0)
+        index = calendar.index_of(paid_week) if paid_week is not None else None
+        if index is not None:
+            paid[username] = bitmap | (1 << index)
+
+    rows = []
+    due_mask = (1 << due) - 1
+    for username, bitmap in paid.items():
+        if not due_mask & ~bitmap:
+            continue
+        missed = calendar.unpaid_weeks(bitmap, today)
+        amount_due = round(len(missed) * weekly_target, 2)
+        rows.append({
+            "username": username,
+            "week_date": week_date,
+            "missed_weeks": len(missed),
+            "amount_due": amount_due,
+            "message": reminder_message(username, missed, amount_due),
+        })
+    return week_date, rows
+
+
+def send_weekly_reminders(today: Optional[date] = None, sender: Optional[ReminderSender] = None) -> ReminderRun:
+    today = today or date.today()
+    sender = sender or load_sender()
+    week_date, rows = build_reminders(today)
+    if week_date is None:
+        return ReminderRun(None, 0, 0, 0)
+
+    queued = sent = 0
+    with session_scope() as session:
+        for start in range(0, len(rows), BATCH_SIZE):
+            queued += queue_reminders(rows[start:start + BATCH_SIZE], session=session)
+        while True:
+            batch = get_unsent_reminders(week_date, BATCH_SIZE, session=session)
+            if not batch:
+                break
+            sender.send_batch(batch)
+            mark_reminders_sent([reminder.id for reminder in batch], datetime.now(timezone.utc), session=session)
+            sent += len(batch)
+    return ReminderRun(week_date, len(rows), queued, sent)
+
+
+def next_run_at(now: datetime) -> datetime:
+    # Next REMINDER_HOUR:00 on the weekday the current group's saving weeks start on
+    weekday = get_settings().start_date.weekday()
+    run_at = datetime.combine(now.date() + timedelta(days=(weekday - now.weekday()) % 7), time(REMINDER_HOUR))
+    return run_at if run_at > now else run_at + timedelta(days=7)
+
+
+def group_ids() -> list[str]:
+    return [DEFAULT_GROUP] + [group.id for group in list_groups()]
+
+
+async def reminder_scheduler():
+    """
+    Sends this week's reminders for every group right away (a no-op if they
+    already went out), then for each group again every week at its
+    ``next_run_at``. Runs until cancelled.
+    """
+    due = group_ids()
+    while True:
+        for group_id in due:
+            with use_group(group_id):
+                try:
+                    result = await run_in_threadpool(send_weekly_reminders)
+                    if result.week_date is not None:
+                        logger.info(
+                            "Reminders for %s, week of %s: %d member(s) behind, %d queued, %d sent",
+                            group_id, result.week_date, result.members_behind, result.queued, result.sent,
+                        )
+                except Exception:
+                    logger.exception("Sending weekly reminders for %s failed; retrying at the next run", group_id)
+
+        # Sleep until the next group's run; groups created meanwhile join then
+        now = datetime.now()
+        run_times = {}
+        for group_id in await run_in_threadpool(group_ids):
+            with use_group(group_id):
+                run_times[group_id] = next_run_at(now)
+        run_at = min(run_times.values())
+        await asyncio.sleep((run_at - now).total_seconds())
+        due = [group_id for group_id, group_run_at in run_times.items() if group_run_at == run_at]
+
+
+def acquire_scheduler_lock():
+    # Non-blocking flock; the open file is returned and must stay referenced
+    # for as long as this process runs the scheduler. None if another has it.
+    try:
+        import fcntl
+    except ImportError:
+        return open(SCHEDULER_LOCK_FILE, "a")
+    lock_file = open(SCHEDULER_LOCK_FILE, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+async def stop_scheduler(task: asyncio.Task):
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
@@ -0,0 +1,90 @@
+"""
+Seeded synthetic data for local testing and benchmarks.
+
+Members are named ``member00000``, ``member00001``, ... and all share one
+password. Deposits are spread over the saving calendar from ``global.env``:
+each member gets a pay rate, so streaks and missed weeks look like a real group
+rather than uniform noise. The same seed always produces the same database.
+"""
+import random
+from datetime import datetime, time, timedelta, timezone
+from typing import Iterator, NamedTuple, Optional
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+from app.auth import revoke_authorization_state
+from app.crud import import_deposits
+from app.database import session_scope
+from app.models import AuthorizedUser, Deposit, DepositArchive, MemberStats, User, WeeklyDeposit
+from app.utils import get_saving_calendar
+
+SEED_PASSWORD = "password"
+AMOUNTS = (150.0, 150.0, 150.0, 150.0, 75.0, 300.0)
+
+
+class SeedSummary(NamedTuple):
+    members: int
+    deposits: int
+
+
+def member_name(index: int) -> str:
+    return f"member{index:05d}"
+
+
+def synthetic_deposits(usernames: list[str], deposits: int, rng: random.Random) -> Iterator[dict]:
+    # Rows for crud.import_deposits, spread over members by a per-member pay rate
+    weeks = get_saving_calendar().weeks
+    if not usernames or not weeks:
+        return
+    weights = [rng.uniform(0.2, 1.0) for _ in usernames]
+    for username in rng.choices(usernames, weights=weights, k=deposits):
+        week_date = rng.choice(weeks)
+        paid_at = datetime.combine(week_date, time(), tzinfo=timezone.utc) + timedelta(
+            days=rng.randrange(7), seconds=rng.randrange(86400)
+        )
+        yield {
+            "username": username,
+            "amount": rng.choice(AMOUNTS),
+            "week_date": week_date,
+            "timestamp": paid_at,
+        }
+
+
+def seed_database(
+    members: int,
+    deposits: int,
+    seed: int = 42,
+    password: str = SEED_PASSWORD,
+    reset: bool = False,
+    session: Optional[Session] = None,
+) -> SeedSummary:
+    """
+    Creates ``members`` authorized users and ``deposits`` deposits.
+
+    Existing members with the same names are reused. With ``reset`` every user,
+    authorization, deposit (archived and rolled up too) and MemberStats row is
+    deleted first.
+    """
+    rng = random.Random(seed)
+    usernames = [member_name(i) for i in range(members)]
+    with session_scope(session) as session:
+        if reset:
+            for model in (Deposit, WeeklyDeposit, DepositArchive, MemberStats, AuthorizedUser, User):
+                session.execute(delete(model))
+            session.commit()
+
+        existing = set(session.exec(select(User.username).where(User.username.in_(usernames))).all())
+        new_users = [name for name in usernames if name not in existing]
+        if new_users:
+            session.execute(insert(User), [{"username": name, "password": password} for name in new_users])
+        authorized = set(session.exec(select(AuthorizedUser.username)).all())
+        to_authorize = [name for name in usernames if name not in authorized]
+        if to_authorize:
+            session.execute(insert(AuthorizedUser), [{"username": name} for name in to_authorize])
+        session.commit()
+        for name in to_authorize:
+            revoke_authorization_state(name)
+
+        inserted = import_deposits(synthetic_deposits(usernames, deposits, rng), session=session)
+    return SeedSummary(members=len(usernames), deposits=inserted)
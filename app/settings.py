@@ -0,0 +1,151 @@
+"""
+Typed application settings, parsed once and shared.
+
+Group settings (dates, target) come from ``global.env``; admin details and
+secrets come from the environment / ``.env`` files. ``get_settings()`` is cheap
+enough to call per request. With ``SETTINGS_HOT_RELOAD=true`` it re-reads
+``global.env`` when the file's mtime changes and notifies the callbacks
+registered with ``on_settings_reload`` (e.g. to rebuild the saving calendar).
+
+Those are the settings of the default group. Code running for another saving
+group (``use_group``, set per request by ``app.groups.GroupMiddleware``) gets
+that group's settings instead, from the loader ``app.groups`` registers with
+``set_group_settings_loader``.
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Iterator, Optional
+
+from dotenv import load_dotenv
+
+# Try loading from .env in project root (for local dev)
+load_dotenv()
+
+# If running on Render, this will override with real secrets
+load_dotenv("/etc/secrets/.env", override=True)
+
+SETTINGS_FILE = os.getenv("SETTINGS_FILE", "global.env")
+DEFAULT_GROUP = "default"  # the original group: savings.db and global.env
+GROUP_ID_PATTERN = re.compile(r"[a-z0-9][a-z0-9-]{0,39}")  # also used in file names
+# Every other group's database (and its cache counters) lives in this directory
+SHARD_DIR = os.getenv("SHARD_DIR", os.path.splitext(os.getenv("SQLITE_FILE", "savings.db"))[0] + "-groups")
+HOT_RELOAD = os.getenv("SETTINGS_HOT_RELOAD", "false").lower() in ("1", "true", "yes")
+RELOAD_CHECK_INTERVAL = 2.0  # seconds between mtime checks when hot reload is on
+
+
+# Opening the content in the global.env file in a dictionary format
+def read_env_file(file_path: str) -> dict:
+    env_vars = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            if '=' in line:
+                key, value = line.strip().split('=', 1)
+                env_vars[key.strip()] = value.strip()
+    return env_vars
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+@dataclass(frozen=True)
+class Settings:
+    start_date: date
+    end_date: date
+    deadline: date
+    target_saving_amount: float
+    weekly_target_amount: float
+    admin_name: Optional[str]
+    admin_email: Optional[str]
+    admin_github: Optional[str]
+    admin_panel_name: str
+
+    @classmethod
+    def load(cls, file_path: str = SETTINGS_FILE) -> "Settings":
+        values = read_env_file(file_path) if os.path.exists(file_path) else {}
+        return cls(
+            start_date=_parse_date(values.get('START_DATE', '2025-04-07')),
+            end_date=_parse_date(values.get('END_DATE', '2026-12-31')),
+            deadline=_parse_date(values.get('EXPECTED_DEADLINE_FOR_TRAVEL', '2025-10-18')),
+            target_saving_amount=float(values.get('TARGET_SAVING_AMOUNT', 4000)),
+            weekly_target_amount=float(values.get('WEEKLY_TARGET_AMOUNT', 150)),
+            admin_name=os.getenv('ADMIN_NAME'),
+            admin_email=os.getenv('ADMIN_EMAIL'),
+            admin_github=os.getenv('ADMIN_GITHUB'),
+            admin_panel_name=os.getenv('ADMIN_PANEL_NAME', ''),
+        )
+
+    def is_admin(self, username: Optional[str]) -> bool:
+        return bool(username) and bool(self.admin_panel_name) and username.lower() == self.admin_panel_name.lower()
+
+
+_current_group: contextvars.ContextVar[str] = contextvars.ContextVar("current_group", default=DEFAULT_GROUP)
+_group_settings_loader: Optional[Callable[[str], Settings]] = None
+
+_settings: Optional[Settings] = None
+_settings_mtime: Optional[int] = None
+_checked_at = 0.0
+_reload_callbacks: list[Callable[[], None]] = []
+_lock = threading.Lock()
+
+
+def _file_mtime() -> Optional[int]:
+    try:
+        return os.stat(SETTINGS_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _load():
+    global _settings, _settings_mtime
+    _settings_mtime = _file_mtime()
+    _settings = Settings.load(SETTINGS_FILE)
+
+
+def current_group() -> str:
+    return _current_group.get()
+
+
+@contextmanager
+def use_group(group_id: str) -> Iterator[str]:
+    # Runs the block (and threadpool calls made from it) against another group
+    token = _current_group.set(group_id)
+    try:
+        yield group_id
+    finally:
+        _current_group.reset(token)
+
+
+def set_group_settings_loader(loader: Callable[[str], Settings]):
+    global _group_settings_loader
+    _group_settings_loader = loader
+
+
+def get_settings() -> Settings:
+    global _checked_at
+    group_id = _current_group.get()
+    if group_id != DEFAULT_GROUP and _group_settings_loader is not None:
+        return _group_settings_loader(group_id)
+    if _settings is None:
+        with _lock:
+            if _settings is None:
+                _load()
+    elif HOT_RELOAD and time.monotonic() - _checked_at > RELOAD_CHECK_INTERVAL:
+        with _lock:
+            _checked_at = time.monotonic()
+            if _file_mtime() != _settings_mtime:
+                _load()
+                for callback in _reload_callbacks:
+                    callback()
+    return _settings
+
+
+def on_settings_reload(callback: Callable[[], None]):
+    # Registers a callback that runs after global.env has been re-read
+    _reload_callbacks.append(callback)
@@ -0,0 +1,95 @@
+"""
+Cold-start helpers: a boot timer, the Jinja bytecode cache and the warm-up pass.
+
+Imported first by ``app/main.py`` so ``boot`` can time the rest of the imports.
+Keep this module free of heavy imports for the same reason.
+
+``FAST_START`` (default on for Render) makes the lifespan warm everything the
+first request would otherwise pay for: SQLite connections and pragmas, the
+saving calendar, the leaderboard aggregates and every template. The phase
+timings are logged at startup and exported on ``/metrics``. Templates are
+compiled into ``JINJA_CACHE_DIR`` by ``python -m app.manage compile-templates``
+at build time, so even the first boot after a deploy only loads bytecode.
+"""
+import logging
+import os
+import time
+
+FAST_START = os.getenv("FAST_START", os.getenv("RENDER", "false")).lower() in ("1", "true", "yes")
+TEMPLATE_DIR = "app/templates"
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", os.path.join("app", ".jinja_cache"))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class BootTimer:
+    """Records how long each startup phase took, in order."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._last = self.started_at
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        # Everything since the previous mark is attributed to `phase`
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started_at
+
+    def report(self) -> str:
+        lines = [f"Startup took {self.total * 1000:.0f} ms:"]
+        for phase, seconds in self.phases:
+            lines.append(f"  {phase:<24} {seconds * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+boot = BootTimer()
+
+
+def bytecode_cache():
+    from jinja2 import FileSystemBytecodeCache
+
+    try:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    except OSError:
+        return None  # read-only checkout: compile in memory as before
+    return FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
+
+def compile_templates(env) -> int:
+    # Loading a template compiles it (or reads the bytecode cache) and keeps it
+    # in the environment's in-memory cache.
+    names = env.list_templates(extensions=("html",))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def warm_up(env):
+    # Everything but the leaderboard aggregates, which main.py primes itself
+    from sqlalchemy import text
+
+    from app.assets import load_manifest
+    from app.database import engine
+    from app.utils import get_saving_calendar
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT count(*) FROM memberstats"))
+    boot.mark("warm: database")
+    get_saving_calendar()
+    load_manifest()
+    boot.mark("warm: calendar/assets")
+    compile_templates(env)
+    boot.mark("warm: templates")
+
+
+def log_report():
+    from app.metrics import STARTUP_PHASES
+
+    for phase, seconds in boot.phases:
+        STARTUP_PHASES.set(seconds, phase)
+    logger.info(boot.report())
@@ -0,0 +1,149 @@
+"""
+Packed-bitset streak and heatmap engine.
+
+Every member gets one Python int whose bit ``i`` is set when saving week ``i``
+(counted from the first saving week) has a positive deposit. Streaks, paid and
+missed counts are then a handful of big-int operations per member instead of a
+Python loop over every saving week.
+"""
+from array import array
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Iterable, Optional, Sequence
+
+
+def max_run(bitmap: int) -> int:
+    # Each `x & (x >> 1)` shortens every run of set bits by one.
+    length = 0
+    while bitmap:
+        bitmap &= bitmap >> 1
+        length += 1
+    return length
+
+
+def run_ending_at_top(bitmap: int) -> int:
+    # Length of the run of set bits ending at the highest set bit.
+    if not bitmap:
+        return 0
+    top = bitmap.bit_length() - 1
+    gaps = ~bitmap & ((1 << (top + 1)) - 1)
+    if not gaps:
+        return top + 1
+    return top - (gaps.bit_length() - 1)
+
+
+def week_index(week_date: date, start_date: date, week_count: int) -> Optional[int]:
+    days = (week_date - start_date).days
+    if days < 0 or days % 7:
+        return None
+    index = days // 7
+    return index if index < week_count else None
+
+
+def paid_bitmap(paid_weeks: Iterable[date], saving_weeks: Sequence[date]) -> int:
+    if not saving_weeks:
+        return 0
+    start, count = saving_weeks[0], len(saving_weeks)
+    bitmap = 0
+    for week_date in paid_weeks:
+        index = week_index(week_date, start, count)
+        if index is not None:
+            bitmap |= 1 << index
+    return bitmap
+
+
+@dataclass
+class WeekMatrix:
+    """
+    Members x saving-weeks matrix with the derived per-member numbers.
+
+    ``amounts[i][w]`` is the amount ``members[i]`` allocated to saving week ``w``;
+    the other lists are parallel to ``members``.
+    """
+    saving_weeks: Sequence[date]
+    members: list[str] = field(default_factory=list)
+    rows: dict[str, int] = field(default_factory=dict)
+    bitmaps: list[int] = field(default_factory=list)
+    amounts: list[array] = field(default_factory=list)
+    max_streaks: list[int] = field(default_factory=list)
+    current_streaks: list[int] = field(default_factory=list)
+    paid_counts: list[int] = field(default_factory=list)
+    missed_counts: list[int] = field(default_factory=list)
+
+    def heatmap(self, username: str) -> list[float]:
+        index = self.rows.get(username)
+        if index is None:
+            return [0.0] * len(self.saving_weeks)
+        return [round(amount, 2) for amount in self.amounts[index]]
+
+
+def build_week_matrix(
+    rows: Iterable[tuple[str, Optional[date], float]],
+    saving_weeks: Sequence[date],
+    today: Optional[date] = None,
+) -> WeekMatrix:
+    """
+    Builds the matrix from ``(username, week_date, amount)`` rows in one pass.
+
+    Rows whose week_date is missing or is not one of the saving weeks are ignored.
+    Paid counts consider weeks that started on or before ``today``. Missed counts
+    consider the weeks that are due, i.e. started strictly before ``today``, as
+    ``SavingCalendar.weeks_before`` and the reminders do.
+    """
+    today = today or date.today()
+    matrix = WeekMatrix(saving_weeks=saving_weeks)
+    week_count = len(saving_weeks)
+    if not week_count:
+        return matrix
+
+    start = saving_weeks[0]
+    start_ordinal = start.toordinal()
+    last_day = week_count * 7
+    row_of = matrix.rows
+    bitmaps = matrix.bitmaps
+    amounts = matrix.amounts
+    empty_row = array("d", [0.0]) * week_count
+
+    for username, week_date, amount in rows:
+        if week_date is None:
+            continue
+        # Inlined week_index(): this loop runs once per deposit row
+        days = week_date.toordinal() - start_ordinal
+        if days < 0 or days >= last_day or days % 7:
+            continue
+        index = days // 7
+        row = row_of.get(username)
+        if row is None:
+            row = row_of[username] = len(matrix.members)
+            matrix.members.append(username)
+            bitmaps.append(0)
+            amounts.append(array("d", empty_row))
+        amounts[row][index] += amount
+        if amount > 0:
+            bitmaps[row] |= 1 << index
+
+    elapsed_mask = (1 << week_index_on_or_before(today, start, week_count)) - 1
+    due = weeks_due(today, start, week_count)
+    due_mask = (1 << due) - 1
+    for bitmap in bitmaps:
+        matrix.max_streaks.append(max_run(bitmap))
+        matrix.current_streaks.append(run_ending_at_top(bitmap))
+        matrix.paid_counts.append((bitmap & elapsed_mask).bit_count())
+        matrix.missed_counts.append(due - (bitmap & due_mask).bit_count())
+    return matrix
+
+
+def week_index_on_or_before(day: date, start_date: date, week_count: int) -> int:
+    # Number of saving weeks that started on or before `day`.
+    days = (day - start_date).days
+    if days < 0:
+        return 0
+    return min(days // 7 + 1, week_count)
+
+
+def weeks_due(day: date, start_date: date, week_count: int) -> int:
+    # Number of saving weeks that started strictly before `day`.
+    days = (day - start_date).days
+    if days <= 0:
+        return 0
+    return min((days + 6) // 7, week_count)
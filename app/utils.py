@@ -1,21 +1,17 @@
-from datetime import datetime, date, timedelta
-
-# Opening the content in the global.env file in a dictionary format
-def read_env_file(file_path: str) -> dict:
-    env_vars = {}
-    with open(file_path, 'r') as file:
-        for line in file:
-            if '=' in line:
-                key, value = line.strip().split('=', 1)
-                env_vars[key] = value
-    return env_vars
-
-START_DATE = datetime.strptime(read_env_file('global.env').get('START_DATE', '2025-04-07'), '%Y-%m-%d').date()
-END_DATE = datetime.strptime(read_env_file('global.env').get('END_DATE', '2026-12-31'), '%Y-%m-%d').date()
-
-def get_all_saving_weeks(start_date: date = START_DATE, end_date: date = END_DATE) -> list[date]:
-    start = start_date
-    end = end_date 
+import csv
+import io
+import json
+from bisect import bisect_left
+from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional, Sequence
+from app.settings import get_settings, on_settings_reload
+from app.streaks import max_run, paid_bitmap, run_ending_at_top
+
+def get_all_saving_weeks(start_date: Optional[date] = None, end_date: Optional[date] = None) -> list[date]:
+    settings = get_settings()
+    start = start_date or settings.start_date
+    end = end_date or settings.end_date
     current = start
     weeks = []
     while current <= end:
@@ -23,15 +19,140 @@ def get_all_saving_weeks(start_date: date = START_DATE, end_date: date = END_DAT
         current += timedelta(days=7)
     return weeks
 
-def compute_streaks(deposits: list[dict], saving_weeks: list[date]) -> int:
-    weeks_with_deposits = set(d["date"] for d in deposits if d["amount"] > 0)
-
-    streak = max_streak = 0
-    for week in saving_weeks:
-        iso = week.isoformat()
-        if iso in weeks_with_deposits:
-            streak += 1
-            max_streak = max(max_streak, streak)
-        else:
-            streak = 0
-    return max_streak
+class SavingCalendar:
+    """
+    Immutable index over the weekly saving dates between two dates.
+
+    Built once and shared by every route. Week ``i`` is ``start_date + 7*i``,
+    which is also bit ``i`` of the paid-week bitmaps used in app.streaks.
+    """
+    __slots__ = ("start_date", "end_date", "weeks", "_index")
+
+    def __init__(self, start_date: date, end_date: date):
+        weeks = tuple(get_all_saving_weeks(start_date, end_date))
+        object.__setattr__(self, "start_date", start_date)
+        object.__setattr__(self, "end_date", end_date)
+        object.__setattr__(self, "weeks", weeks)
+        object.__setattr__(self, "_index", {week: i for i, week in enumerate(weeks)})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SavingCalendar is immutable")
+
+    def __len__(self) -> int:
+        return len(self.weeks)
+
+    def __iter__(self):
+        return iter(self.weeks)
+
+    def index_of(self, week_date: date) -> Optional[int]:
+        return self._index.get(week_date)
+
+    def weeks_before(self, day: date) -> int:
+        # How many saving weeks started strictly before `day` (i.e. are due)
+        return bisect_left(self.weeks, day)
+
+    def bitmap(self, paid_weeks: Iterable[date]) -> int:
+        return paid_bitmap(paid_weeks, self.weeks)
+
+    def unpaid_weeks(self, paid: int, today: date) -> list[date]:
+        # Due weeks whose bit is not set in the member's paid-week bitmap
+        due_mask = (1 << self.weeks_before(today)) - 1
+        missing = due_mask & ~paid
+        unpaid = []
+        while missing:
+            low_bit = missing & -missing
+            unpaid.append(self.weeks[low_bit.bit_length() - 1])
+            missing ^= low_bit
+        return unpaid
+
+    def first_unpaid_week(self, paid: int, today: date) -> Optional[date]:
+        missing = ((1 << self.weeks_before(today)) - 1) & ~paid
+        if not missing:
+            return None
+        return self.weeks[(missing & -missing).bit_length() - 1]
+
+def get_saving_calendar() -> SavingCalendar:
+    # The current group's calendar; groups with the same dates share one
+    settings = get_settings()
+    return _saving_calendar(settings.start_date, settings.end_date)
+
+@lru_cache(maxsize=256)
+def _saving_calendar(start_date: date, end_date: date) -> SavingCalendar:
+    return SavingCalendar(start_date, end_date)
+
+# A reloaded global.env may move START_DATE/END_DATE
+on_settings_reload(_saving_calendar.cache_clear)
+
+def compute_streaks(deposits: list[dict], saving_weeks: Optional[Sequence[date]] = None) -> int:
+    saving_weeks = saving_weeks or get_saving_calendar().weeks
+    bitmap = paid_bitmap(
+        (date.fromisoformat(d["date"]) for d in deposits if d["amount"] > 0),
+        saving_weeks,
+    )
+    return max_run(bitmap)
+
+def compute_streak_stats(paid_weeks: set[date], saving_weeks: Optional[Sequence[date]] = None) -> tuple[int, int]:
+    # Returns (current_streak, max_streak) where the current streak is the run
+    # of consecutive saving weeks ending at the latest paid one.
+    bitmap = paid_bitmap(paid_weeks, saving_weeks or get_saving_calendar().weeks)
+    return run_ending_at_top(bitmap), max_run(bitmap)
+
+def parse_deposit_rows(filename: str, content: bytes) -> list[dict]:
+    # Parses an admin import file (JSON array or CSV with a header row) into rows
+    # ready for crud.import_deposits. Raises ValueError naming the bad row.
+    text = content.decode("utf-8-sig")
+    if filename.lower().endswith(".json"):
+        records = json.loads(text)
+        if not isinstance(records, list):
+            raise ValueError("JSON import must be an array of deposit objects")
+    else:
+        records = list(csv.DictReader(io.StringIO(text)))
+
+    imported_at = datetime.now(timezone.utc)
+    rows = []
+    for line, record in enumerate(records, start=1):
+        try:
+            username = (record.get("username") or "").strip()
+            if not username:
+                raise ValueError("missing username")
+            week_date = record.get("week_date") or None
+            timestamp = record.get("timestamp") or None
+            rows.append({
+                "username": username,
+                "amount": float(record["amount"]),
+                "week_date": date.fromisoformat(week_date) if week_date else None,
+                "timestamp": datetime.fromisoformat(timestamp) if timestamp else imported_at,
+            })
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"Row {line}: {e}") from e
+    return rows
+
+DEPOSIT_EXPORT_COLUMNS = ("id", "username", "amount", "week_date", "timestamp")
+
+def encode_deposits_csv(pages: Iterable[list[tuple]]) -> Iterator[bytes]:
+    # One encoded chunk per page of crud.iter_deposit_pages, header first
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(DEPOSIT_EXPORT_COLUMNS)
+    yield buffer.getvalue().encode()
+    for page in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (id_, username, amount, week_date.isoformat() if week_date else "", timestamp.isoformat())
+            for id_, username, amount, week_date, timestamp in page
+        )
+        yield buffer.getvalue().encode()
+
+def encode_deposits_jsonl(pages: Iterable[list[tuple]]) -> Iterator[bytes]:
+    for page in pages:
+        yield "".join(
+            json.dumps({
+                "id": id_,
+                "username": username,
+                "amount": amount,
+                "week_date": week_date.isoformat() if week_date else None,
+                "timestamp": timestamp.isoformat(),
+            }) + "\n"
+            for id_, username, amount, week_date, timestamp in page
+        ).encode()
@@ -0,0 +1,143 @@
+"""
+Benchmark for group-commit deposits (app/group_commit.py).
+
+Fires the same burst of concurrent deposit writes at a throwaway SQLite
+database twice. The first run gives every write its own session and commit, as
+``/deposit`` does by default. The second sends them through the group-commit
+writer. Reports writes/s, p50/p95/p99 latency, the transactions SQLite really
+committed and failures ("database is locked" counted separately). Commits are
+counted by engine listeners: a ``commit`` that ends an open SQLite transaction,
+or a RELEASE that did (a savepoint taken outside any transaction commits on
+its own). Run from the repository root:
+
+    python -m benchmarks.bench_group_commit
+    python -m benchmarks.bench_group_commit --concurrency 256 --writes 5000 --batch 128 --delay-ms 2
+    SQLITE_SYNCHRONOUS=FULL python -m benchmarks.bench_group_commit
+
+The writes go straight to the crud layer, so HTTP handling, which is the
+same in both modes, doesn't dilute the difference.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.bench_routes import percentile
+
+
+async def run_mode(mode: str, args: argparse.Namespace, usernames: list[str], weeks: list[date]) -> dict:
+    from sqlalchemy import event
+    from sqlalchemy.exc import OperationalError
+
+    from app import async_crud
+    from app.database import async_engine, async_session_scope, engine
+    from app.group_commit import DepositWriter
+
+    rng = random.Random(args.seed)
+    today = weeks[-1]
+    writes = [(rng.choice(usernames), [(rng.choice(weeks), 150.0)]) for _ in range(args.writes)]
+    remaining = iter(writes)
+    latencies: list[float] = []
+    failures = locked = 0
+    writer = DepositWriter(max_batch=args.batch, max_delay_ms=args.delay_ms, queue_size=args.writes)
+
+    async def save(username, allocations):
+        if mode == "group":
+            return await writer.submit(username, allocations, today)
+        async with async_session_scope() as session:
+            return await async_crud.save_deposits_bulk(username, allocations, today=today, session=session)
+
+    async def worker():
+        nonlocal failures, locked
+        for username, allocations in remaining:
+            started = time.perf_counter()
+            try:
+                await save(username, allocations)
+            except OperationalError as e:
+                failures += 1
+                locked += "database is locked" in str(e)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    commits = 0
+
+    def count_commit(conn):
+        nonlocal commits
+        commits += conn.connection.driver_connection.in_transaction
+
+    def count_release(conn, cursor, statement, parameters, context, executemany):
+        nonlocal commits
+        if statement.startswith("RELEASE") and not conn.connection.driver_connection.in_transaction:
+            commits += 1
+
+    counted_engine = async_engine.sync_engine if async_engine is not None else engine
+    event.listen(counted_engine, "commit", count_commit)
+    event.listen(counted_engine, "after_cursor_execute", count_release)
+    if mode == "group":
+        writer.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    if mode == "group":
+        await writer.stop()
+    event.remove(counted_engine, "commit", count_commit)
+    event.remove(counted_engine, "after_cursor_execute", count_release)
+
+    latencies.sort()
+    return {
+        "writes": len(latencies),
+        "writes_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "commits": commits,
+        "failures": failures,
+        "locked": locked,
+    }
+
+
+async def run(args: argparse.Namespace):
+    from app.database import create_db_and_tables
+    from app.seed import member_name, seed_database
+    from app.utils import get_saving_calendar
+
+    create_db_and_tables()
+    seed_database(args.members, 0, seed=args.seed)
+    usernames = [member_name(i) for i in range(args.members)]
+    weeks = list(get_saving_calendar().weeks)
+
+    print(f"{'mode':<12} {'writes':>7} {'writes/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'commits':>8} "
+          f"{'failed':>7} {'locked':>7}")
+    for mode in args.modes:
+        result = await run_mode(mode, args, usernames, weeks)
+        print(
+            f"{mode:<12} {result['writes']:>7} {result['writes_per_s']:>9.1f} {result['p50_ms']:>9.2f} "
+            f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['commits']:>8} "
+            f"{result['failures']:>7} {result['locked']:>7}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_group_commit")
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--writes", type=int, default=2000, help="Deposit writes per mode")
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--batch", type=int, default=64, help="Group commit: max requests per commit")
+    parser.add_argument("--delay-ms", type=float, default=5, help="Group commit: max wait to fill a batch")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--modes", nargs="+", choices=("per-request", "group"), default=["per-request", "group"])
+    args = parser.parse_args(argv)
+
+    # Must happen before app.database is imported
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["SQLITE_FILE"] = os.path.join(tmpdir, "bench.db")
+        asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,179 @@
+"""
+Benchmark for the read projections in app/crud.py.
+
+Seeds a throwaway SQLite database with a large ledger, then runs the reads
+behind ``/login``, ``/dashboard`` and the leaderboard rankings two ways. The
+``orm`` way is how they used to load full SQLModel objects. The
+``projection`` way is the current column-only crud functions. Every request
+gets a fresh session, as in the app. For each route and mode it reports CPU
+time per request and, under tracemalloc, the peak memory a request allocates
+and how much stays allocated after it (its result, plus any cache growth).
+Run from the repository root:
+
+    python -m benchmarks.bench_projections
+    python -m benchmarks.bench_projections --members 5000 --deposits 300000 --requests 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+
+def orm_reads():
+    # The pre-projection read paths, kept here as the baseline
+    from sqlmodel import select
+
+    from app.crud import _ledger
+    from app.models import AuthorizedUser, Deposit, DepositArchive, MemberStats, User
+
+    def login(session, username):
+        statement = (
+            select(User, AuthorizedUser.id)
+            .join(AuthorizedUser, AuthorizedUser.username == User.username, isouter=True)
+            .where(User.username == username)
+        )
+        row = session.exec(statement).first()
+        return (row[0], row[1] is not None) if row else None
+
+    def dashboard(session, username):
+        ledger = _ledger(username)
+        paid_weeks = session.exec(select(ledger.c.week_date).where(ledger.c.week_date.is_not(None)).distinct()).all()
+        stats = session.exec(select(MemberStats).where(MemberStats.username == username)).first()
+        recent = []
+        for model in (Deposit, DepositArchive):
+            statement = select(model).where(model.username == username).order_by(model.timestamp.desc()).limit(5)
+            recent += session.exec(statement).all()
+        recent = sorted(recent, key=lambda deposit: deposit.timestamp, reverse=True)[:5]
+        return paid_weeks, stats.total_saved if stats else 0, [(d.week_date, d.amount) for d in recent]
+
+    def leaderboard(session, username):
+        member_stats = session.exec(select(MemberStats).order_by(MemberStats.total_saved.desc())).all()
+        sorted_streaks = sorted(member_stats, key=lambda s: s.max_streak, reverse=True)
+        return (
+            [s.username for s in member_stats],
+            [round(s.total_saved, 2) for s in member_stats],
+            [s.username for s in sorted_streaks],
+            [s.max_streak for s in sorted_streaks],
+        )
+
+    return {"login": login, "dashboard": dashboard, "leaderboard": leaderboard}
+
+
+def projection_reads():
+    from app import crud
+
+    def login(session, username):
+        return crud.get_user_with_authorization(username, session=session)
+
+    def dashboard(session, username):
+        paid_weeks = crud.get_paid_week_dates(username, session=session)
+        total_saved = crud.get_total_saved(username, session=session)
+        recent = crud.get_recent_deposits(username, limit=5, session=session)
+        return paid_weeks, total_saved, [(d.week_date, d.amount) for d in recent]
+
+    def leaderboard(session, username):
+        columns = crud.get_leaderboard_columns(session=session)
+        by_streak = sorted(range(len(columns.usernames)), key=columns.max_streaks.__getitem__, reverse=True)
+        return (
+            list(columns.usernames),
+            [round(total, 2) for total in columns.total_saved],
+            [columns.usernames[i] for i in by_streak],
+            [columns.max_streaks[i] for i in by_streak],
+        )
+
+    return {"login": login, "dashboard": dashboard, "leaderboard": leaderboard}
+
+
+def check_same(modes: dict, usernames: list[str]):
+    from app.database import get_session
+
+    def login_fields(result):
+        user, authorized = result
+        return user.id, user.username, user.password, authorized
+
+    with get_session() as session:
+        for username in usernames:
+            for route in ("login", "dashboard", "leaderboard"):
+                orm = modes["orm"][route](session, username)
+                projection = modes["projection"][route](session, username)
+                if route == "login":
+                    orm = login_fields(orm)
+                assert tuple(orm) == tuple(projection), f"{route} reads disagree for {username}"
+
+
+def measure(read, usernames: list[str], requests: int, traced: int) -> dict:
+    from app.database import get_session
+
+    def request(username):
+        with get_session() as session:
+            return read(session, username)
+
+    for username in usernames[:10]:  # warm statement caches and the page cache
+        request(username)
+
+    started = time.process_time()
+    for i in range(requests):
+        request(usernames[i % len(usernames)])
+    cpu = (time.process_time() - started) / requests
+
+    peaks = []
+    results = []
+    tracemalloc.start()
+    for i in range(traced):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = request(usernames[i % len(usernames)])
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        results.append(current - before)
+        del result
+    tracemalloc.stop()
+    return {
+        "cpu_us": cpu * 1e6,
+        "peak_kib": sum(peaks) / len(peaks) / 1024,
+        "retained_kib": sum(results) / len(results) / 1024,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_projections")
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--deposits", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=300, help="Untraced requests per route and mode, for CPU time")
+    parser.add_argument("--traced", type=int, default=50, help="Requests per route and mode under tracemalloc")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    # Must happen before app.database is imported
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ["SQLITE_FILE"] = os.path.join(tmpdir, "bench.db")
+        from app.database import create_db_and_tables
+        from app.seed import member_name, seed_database
+
+        create_db_and_tables()
+        seed_database(args.members, args.deposits, seed=args.seed)
+        usernames = [member_name(i) for i in range(args.members)]
+        random.Random(args.seed).shuffle(usernames)
+
+        modes = {"orm": orm_reads(), "projection": projection_reads()}
+        check_same(modes, usernames[:20])
+        print(f"{'route':<12} {'mode':<11} {'cpu us/req':>11} {'peak KiB/req':>13} {'retained KiB':>13}")
+        for route in ("login", "dashboard", "leaderboard"):
+            results = {mode: measure(reads[route], usernames, args.requests, args.traced) for mode, reads in modes.items()}
+            for mode, result in results.items():
+                print(
+                    f"{route:<12} {mode:<11} {result['cpu_us']:>11.0f} {result['peak_kib']:>13.1f} "
+                    f"{result['retained_kib']:>13.1f}"
+                )
+            orm, projection = results["orm"], results["projection"]
+            print(
+                f"{'':<12} {'saving':<11} {orm['cpu_us'] / projection['cpu_us']:>10.1f}x "
+                f"{orm['peak_kib'] / projection['peak_kib']:>12.1f}x"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
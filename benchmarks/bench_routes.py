@@ -0,0 +1,206 @@
+"""
+Load test for the web routes, driven in-process through the ASGI app.
+
+Seeds a throwaway SQLite database with synthetic members and deposits
+(app/seed.py), logs in one client per concurrent user, then fires requests at
+each route and reports p50/p95/p99 latency, requests/s and SQL statements per
+request. Run from the repository root:
+
+    python -m benchmarks.bench_routes
+    python -m benchmarks.bench_routes --members 200 --deposits 50000 --concurrency 32 --requests 2000
+    python -m benchmarks.bench_routes --output after.json --baseline before.json
+
+``--db`` benchmarks an existing database file instead (``--deposits 0`` to
+skip seeding it). Set ``DB_ASYNC=true`` to measure the aiosqlite engine.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+# Route name -> (method, path, form data, expected status)
+ROUTES = {
+    "login": ("POST", "/login", "credentials", 302),
+    "dashboard": ("GET", "/dashboard", None, 200),
+    "leaderboard": ("GET", "/leaderboard", None, 200),
+    "api_leaderboard": ("GET", "/api/leaderboard", None, 200),
+    "deposit": ("POST", "/deposit", {"amount": "150"}, 302),
+}
+
+current_route = contextvars.ContextVar("current_route", default=None)
+query_counts: Counter = Counter()
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    route = current_route.get()
+    if route is not None:
+        query_counts[route] += 1
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_route(name: str, clients: list, usernames: list[str], requests: int) -> dict:
+    method, path, data, expected = ROUTES[name]
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(client, username):
+        nonlocal errors
+        form = {"username": username, "password": "password"} if data == "credentials" else data
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.request(method, path, data=form)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != expected:
+                errors += 1
+
+    token = current_route.set(name)
+    query_counts[name] = 0
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(client, username) for client, username in zip(clients, usernames)))
+    finally:
+        current_route.reset(token)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(query_counts[name] / len(latencies), 2) if latencies else 0.0,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+    from sqlalchemy import event
+
+    from app import database
+    from app.main import app
+    from app.seed import member_name, seed_database
+
+    for engine in filter(None, (database.engine, getattr(database.async_engine, "sync_engine", None))):
+        event.listen(engine, "before_cursor_execute", count_query)
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        if args.deposits:
+            seed_database(args.members, args.deposits, seed=args.seed)
+
+        transport = httpx.ASGITransport(app=app)
+        usernames = [member_name(i % args.members) for i in range(args.concurrency)]
+        clients = [
+            httpx.AsyncClient(transport=transport, base_url="http://bench", follow_redirects=False)
+            for _ in usernames
+        ]
+        try:
+            for client, username in zip(clients, usernames):
+                response = await client.post("/login", data={"username": username, "password": "password"})
+                if response.status_code != 302:
+                    raise SystemExit(f"Could not log in as {username}: HTTP {response.status_code}")
+            for name in args.routes:
+                results[name] = await run_route(name, clients, usernames, args.requests)
+                print_row(name, results[name])
+        finally:
+            for client in clients:
+                await client.aclose()
+    return results
+
+
+def print_row(name: str, result: dict, baseline: dict = None):
+    line = (
+        f"{name:<16} {result['requests']:>6} {result['rps']:>9.1f} {result['p50_ms']:>9.2f} "
+        f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['queries_per_request']:>7.2f} {result['errors']:>6}"
+    )
+    if baseline:
+        change = (result["p95_ms"] - baseline["p95_ms"]) / baseline["p95_ms"] * 100 if baseline["p95_ms"] else 0.0
+        line += f"   p95 {change:+.1f}% vs baseline"
+    print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_routes")
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--deposits", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per route")
+    parser.add_argument("--routes", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument("--db", help="Benchmark this SQLite file instead of a fresh temporary one")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare p95 against")
+    args = parser.parse_args(argv)
+
+    # Must happen before app.database is imported
+    tmpdir = None
+    if args.db is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        os.environ["SQLITE_FILE"] = os.path.join(tmpdir.name, "bench.db")
+    else:
+        os.environ["SQLITE_FILE"] = args.db
+
+    print(f"{'route':<16} {'reqs':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'sql/req':>7} {'errors':>6}")
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} ({baseline['meta'].get('commit')}):")
+        for name, result in results.items():
+            if name in baseline["routes"]:
+                print_row(name, result, baseline["routes"][name])
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": sys.version.split()[0],
+                "db_async": os.getenv("DB_ASYNC", "false"),
+                "members": args.members,
+                "deposits": args.deposits,
+                "seed": args.seed,
+                "concurrency": args.concurrency,
+                "requests_per_route": args.requests,
+            },
+            "routes": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
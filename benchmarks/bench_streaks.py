@@ -0,0 +1,88 @@
+"""
+Benchmark for the packed-bitset streak engine (app/streaks.py).
+
+Generates synthetic deposit rows for N members over multi-year saving calendars
+and compares the per-member string/set loop the leaderboard used to run against
+build_week_matrix. Run from the repository root:
+
+    python -m benchmarks.bench_streaks
+    python -m benchmarks.bench_streaks --members 1000 5000 --years 2 5 --pay-rate 0.8
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from app.streaks import build_week_matrix
+from app.utils import get_all_saving_weeks
+
+
+def legacy_streaks(rows, saving_weeks):
+    # The pre-bitset leaderboard path: group dict rows per user, then walk every week.
+    user_deposits = defaultdict(list)
+    for username, week_date, amount in rows:
+        user_deposits[username].append({"date": week_date.isoformat(), "amount": amount})
+
+    result = {}
+    for username, deposits in user_deposits.items():
+        weeks_with_deposits = set(d["date"] for d in deposits if d["amount"] > 0)
+        streak = max_streak = 0
+        for week in saving_weeks:
+            if week.isoformat() in weeks_with_deposits:
+                streak += 1
+                max_streak = max(max_streak, streak)
+            else:
+                streak = 0
+        result[username] = max_streak
+    return result
+
+
+def make_rows(members: int, saving_weeks: list, pay_rate: float, rng: random.Random):
+    rows = []
+    for m in range(members):
+        username = f"member{m:05d}"
+        for week in saving_weeks:
+            if rng.random() < pay_rate:
+                rows.append((username, week, 150.0))
+    return rows
+
+
+def best_of(repeat: int, fn, *args):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, nargs="+", default=[500, 2000, 5000])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--pay-rate", type=float, default=0.85)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start_date = date(2025, 4, 7)
+    print(f"{'members':>8} {'weeks':>6} {'rows':>9} {'legacy ms':>10} {'bitset ms':>10} {'speedup':>8} {'bitset ns/row':>14}")
+    for years in args.years:
+        saving_weeks = get_all_saving_weeks(start_date, start_date + timedelta(days=365 * years))
+        for members in args.members:
+            rows = make_rows(members, saving_weeks, args.pay_rate, rng)
+            legacy_time, legacy = best_of(args.repeat, legacy_streaks, rows, saving_weeks)
+            bitset_time, matrix = best_of(args.repeat, build_week_matrix, rows, saving_weeks)
+            assert legacy == dict(zip(matrix.members, matrix.max_streaks)), "engines disagree"
+            print(
+                f"{members:>8} {len(saving_weeks):>6} {len(rows):>9} "
+                f"{legacy_time * 1000:>10.1f} {bitset_time * 1000:>10.1f} "
+                f"{legacy_time / bitset_time:>7.1f}x {bitset_time / len(rows) * 1e9:>14.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
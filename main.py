@@ -1,7 +1,65 @@
 # main.py (in root)
+"""
+Production launcher.
+
+    PORT=8000 WEB_CONCURRENCY=4 python main.py
+
+Environment:
+    HOST             interface to bind (default 0.0.0.0)
+    PORT             port to bind (default 8000; set by Render)
+    WEB_CONCURRENCY  worker processes (default 1)
+    KEEP_ALIVE       seconds to hold idle keep-alive connections (default 5)
+    BACKLOG          pending-connection queue length (default 2048)
+    GRACEFUL_TIMEOUT seconds to wait for open requests on shutdown (default 10);
+                     live leaderboard streams never finish on their own
+    SESSION_SECRET   key that signs session cookies; with several workers and
+                     none set, one is generated here and shared by all of them
+    FORWARDED_ALLOW_IPS
+                     proxies whose X-Forwarded-For/-Proto headers uvicorn trusts
+                     (default 127.0.0.1). Behind Render's proxy, set it to the
+                     proxy's addresses; "*" lets any client fake its IP and scheme
+
+Workers share one SQLite database and keep their caches coherent through the
+shared counters in app/coherence.py.
+"""
+import logging
+import os
+import secrets
 
 import uvicorn
-from app.main import app  # This assumes your FastAPI instance is named `app` in app/main.py
+
+
+def main():
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and not os.getenv("SESSION_SECRET"):
+        # Each worker would otherwise pick its own random key and reject the
+        # cookies signed by the others. Workers inherit the environment.
+        os.environ["SESSION_SECRET"] = secrets.token_hex(32)
+        logging.getLogger("uvicorn.error").warning(
+            "SESSION_SECRET is not set; generated one for this run. Logins end when the server restarts."
+        )
+    if workers > 1:
+        # Create tables and backfill aggregates once, so the workers' lifespans
+        # don't race each other doing it.
+        from app.crud import ensure_member_stats
+        from app.database import create_db_and_tables
+        from app.groups import create_catalog, register_default_members
+
+        create_db_and_tables()
+        create_catalog()
+        register_default_members()
+        ensure_member_stats()
+
+    uvicorn.run(
+        "app.main:app",  # import string: each worker imports the app itself
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE", "5")),
+        backlog=int(os.getenv("BACKLOG", "2048")),
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", "10")),
+    )
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    main()
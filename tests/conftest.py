@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+
+# app.database, app.coherence and app.groups read these at import time
+_tmpdir = tempfile.mkdtemp(prefix="savings-tests-")
+os.environ["SQLITE_FILE"] = os.path.join(_tmpdir, "savings.db")
+os.environ["ADMIN_PANEL_NAME"] = "admin"
+os.environ["SESSION_SECRET"] = "test-secret"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from app.database import create_db_and_tables
+    from app.groups import create_catalog
+
+    create_db_and_tables()
+    create_catalog()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def register_member():
+    def register(client, username: str, password: str = "pw", authorize: bool = True):
+        # Registers and logs in username on client, authorized unless told otherwise
+        from app.crud import authorize_user
+
+        client.post("/register", data={"username": username, "password": password})
+        if authorize:
+            authorize_user(username)
+        client.post("/login", data={"username": username, "password": password}, follow_redirects=False)
+
+    return register
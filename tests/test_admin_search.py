@@ -0,0 +1,16 @@
+from app import crud
+
+LAST = chr(0x10FFFF)
+
+
+def test_prefix_search_handles_the_last_code_point(client, register_member):
+    crud.create_user("search" + LAST, "pw")
+    crud.create_user("search" + LAST + "x", "pw")
+    crud.create_user("searcha", "pw")
+
+    usernames = [row[1] for row in crud.search_users("search" + LAST).rows]
+    assert usernames == ["search" + LAST, "search" + LAST + "x"]
+    assert crud.search_users(LAST).rows == []
+
+    register_member(client, "admin")
+    assert client.get("/admin-access", params={"q": "search" + LAST}).status_code == 200
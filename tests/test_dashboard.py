@@ -0,0 +1,5 @@
+def test_goal_renders_without_decimals(client, register_member):
+    register_member(client, "goal1")
+    page = client.get("/dashboard").text
+    assert '<strong>Goal</strong> <span style="float: right;">4000 EGP</span>' in page
+    assert "EGP / 4000 EGP" in page
@@ -0,0 +1,14 @@
+from app import crud
+
+
+def test_deposit_goes_to_session_owner(client, register_member):
+    register_member(client, "owner1")
+    crud.create_user("victim1", "pw")
+    response = client.post(
+        "/deposit",
+        data={"username": "victim1", "amount": "100", "selected_weeks": ["2025-04-07"]},
+        follow_redirects=False,
+    )
+    assert response.status_code == 302
+    assert crud.get_total_saved("owner1") == 100
+    assert crud.get_total_saved("victim1") == 0
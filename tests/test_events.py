@@ -0,0 +1,17 @@
+from app import main
+
+
+def test_leaderboard_events_need_an_authorized_session(client, register_member, monkeypatch):
+    async def finished_stream():
+        yield b"retry: 3000\n\n"
+
+    monkeypatch.setattr(main.leaderboard_events, "subscribe", finished_stream)
+    assert client.get("/api/leaderboard/events").status_code == 401
+
+    register_member(client, "events_pending", authorize=False)
+    assert client.get("/api/leaderboard/events").status_code == 403
+
+    register_member(client, "events_member")
+    response = client.get("/api/leaderboard/events")
+    assert response.status_code == 200
+    assert response.text == "retry: 3000\n\n"
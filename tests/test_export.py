@@ -0,0 +1,29 @@
+from app import crud
+
+
+def exported_members(response) -> set[str]:
+    lines = response.text.splitlines()[1:]
+    return {line.split(",")[1] for line in lines}
+
+
+def test_member_exports_only_their_own_deposits(client, register_member):
+    crud.create_user("export_other", "pw")
+    crud.save_deposit("export_other", 50)
+    register_member(client, "export_self")
+    crud.save_deposit("export_self", 100)
+
+    response = client.get("/export/deposits.csv")
+    assert response.status_code == 200
+    assert exported_members(response) == {"export_self"}
+    assert client.get("/export/deposits.csv", params={"member": "export_self"}).status_code == 200
+    assert client.get("/export/deposits.csv", params={"member": "export_other"}).status_code == 403
+
+
+def test_admin_exports_any_member(client, register_member):
+    crud.create_user("export_target", "pw")
+    crud.save_deposit("export_target", 75)
+    register_member(client, "admin")
+
+    response = client.get("/export/deposits.csv", params={"member": "export_target"})
+    assert response.status_code == 200
+    assert exported_members(response) == {"export_target"}
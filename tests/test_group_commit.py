@@ -0,0 +1,53 @@
+from datetime import date
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app import crud
+from app.database import engine
+from app.seed import seed_database
+
+WEEK = date(2025, 4, 7)
+
+
+def test_batch_commits_once():
+    seed_database(3, 0, seed=1)
+    statements = []
+    commits = []
+
+    def count_commit(conn):
+        commits.append(conn)
+
+    requests = [(f"member0000{i}", [(WEEK, 150.0)], WEEK) for i in range(3)]
+    with Session(engine) as session:
+        dbapi_connection = session.connection().connection.driver_connection
+        dbapi_connection.set_trace_callback(statements.append)
+        event.listen(engine, "commit", count_commit)
+        try:
+            results = crud.save_deposit_batch(requests, session=session)
+        finally:
+            event.remove(engine, "commit", count_commit)
+            dbapi_connection.set_trace_callback(None)
+
+    assert all(result.allocations for result in results)
+    assert len(commits) == 1
+    keywords = [statement.split()[0].upper() for statement in statements]
+    control = [keyword for keyword in keywords if keyword in ("BEGIN", "SAVEPOINT", "RELEASE", "COMMIT")]
+    # One transaction around every savepoint; no RELEASE runs outside it
+    assert control[0] == "BEGIN" and control[-1] == "COMMIT"
+    assert control.count("BEGIN") == 1 and control.count("COMMIT") == 1
+    assert control.count("SAVEPOINT") == len(requests)
+
+
+def test_failed_request_rolls_back_alone():
+    seed_database(2, 0, seed=1)
+    before = {username: crud.get_total_saved(username) for username in ("member00000", "member00001")}
+    requests = [
+        ("member00000", [(WEEK, 10.0)], WEEK),
+        ("member00001", [(WEEK, "not a number")], WEEK),
+    ]
+    results = crud.save_deposit_batch(requests)
+    assert not isinstance(results[0], Exception)
+    assert isinstance(results[1], Exception)
+    assert crud.get_total_saved("member00000") == before["member00000"] + 10
+    assert crud.get_total_saved("member00001") == before["member00001"]
@@ -0,0 +1,23 @@
+from sqlmodel import Session, select
+
+from app import crud
+from app.groups import catalog_engine
+from app.models import GroupMember
+
+
+def catalog_group(username: str):
+    with Session(catalog_engine) as session:
+        return session.exec(select(GroupMember.group_id).where(GroupMember.username == username)).first()
+
+
+def test_register_existing_shard_user_leaves_no_claim(client):
+    crud.create_user("legacy1", "pw")  # in the default database, not in the catalog
+    response = client.post("/register", data={"username": "legacy1", "password": "other"})
+    assert "already exists" in response.text
+    assert catalog_group("legacy1") is None
+
+
+def test_register_claims_username(client):
+    response = client.post("/register", data={"username": "fresh1", "password": "pw"}, follow_redirects=False)
+    assert response.status_code == 302
+    assert catalog_group("fresh1") == "default"
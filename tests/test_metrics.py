@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app import database
+from app.database import engine
+
+
+def test_failed_queries_leave_no_timer_behind(monkeypatch):
+    durations = []
+    monkeypatch.setattr(database, "record_query", durations.append)
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TEMP TABLE unique_names (name TEXT UNIQUE)"))
+        connection.execute(text("INSERT INTO unique_names VALUES ('a')"))
+        durations.clear()
+        for _ in range(3):
+            with pytest.raises(IntegrityError):
+                connection.execute(text("INSERT INTO unique_names VALUES ('a')"))
+        connection.execute(text("SELECT 1"))
+        assert not any(isinstance(value, list) for value in connection.info.values())
+    assert len(durations) == 1
+    assert 0 <= durations[0] < 1
+
+
+def test_metrics_need_the_token_or_the_admin(client, register_member, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-token")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-token"}).status_code == 200
+
+    monkeypatch.delenv("METRICS_TOKEN")
+    register_member(client, "metrics_member")
+    assert client.get("/metrics").status_code == 401
+    register_member(client, "admin")
+    assert client.get("/metrics").status_code == 200
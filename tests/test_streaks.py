@@ -0,0 +1,35 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.streaks import build_week_matrix
+from app.utils import SavingCalendar
+
+CALENDAR = SavingCalendar(date(2025, 4, 7), date(2025, 6, 30))
+
+
+@pytest.mark.parametrize("today", [
+    date(2025, 4, 14),  # first day of the second week
+    date(2025, 4, 17),  # mid-week
+    date(2025, 4, 20),  # last day of the second week
+    date(2025, 4, 7),  # first day of the calendar
+    date(2025, 4, 1),  # before it
+])
+def test_missed_weeks_match_calendar(today):
+    rows = [("payer", date(2025, 4, 7), 150.0)]
+    matrix = build_week_matrix(rows, CALENDAR.weeks, today=today)
+    paid = CALENDAR.bitmap([date(2025, 4, 7)])
+    # The same count for a member who paid and for the reminders
+    assert matrix.missed_counts[matrix.rows["payer"]] == len(CALENDAR.unpaid_weeks(paid, today))
+
+    never_paid = build_week_matrix([("saver", date(2025, 4, 7), 0.0)], CALENDAR.weeks, today=today)
+    assert never_paid.missed_counts[0] == CALENDAR.weeks_before(today)
+
+
+def test_week_paid_today_is_not_missed():
+    today = date(2025, 4, 17)
+    rows = [("payer", date(2025, 4, 7), 150.0), ("payer", date(2025, 4, 14), 150.0)]
+    matrix = build_week_matrix(rows, CALENDAR.weeks, today=today)
+    assert matrix.missed_counts[0] == 0
+    assert matrix.paid_counts[0] == 2
+    assert build_week_matrix(rows, CALENDAR.weeks, today=today + timedelta(days=7)).missed_counts[0] == 1